@@ -0,0 +1,642 @@
+"""
+This is the asyncio implementation of the Tic Tac Toe server.
+It runs the lobby, the join flow and the turn loop of every game as
+coroutines on a single event loop, so waiting connections only cost memory
+instead of an OS thread each. It speaks the same wire protocol as Server.py.
+"""
+
+# Imports
+import asyncio
+import os
+import signal
+import time
+
+from Engine import shutdown_pool, submit_search
+from Game import WIN_LENGTH, GameState, default_win_length
+from Log import get_logger, setup_logging
+from Metrics import metrics
+from Protocol import (CLOSE_FLUSH_TIMEOUT, OUTBOX_LIMIT, ProtocolError, TokenBucket, encode_message, read_message,
+                      write_message)
+from Registry import GameRegistry
+from Server import GRACE_PERIOD, HOST, PORT, REJECTIONS, Timeouts
+from Spectators import Feed
+
+# Global registry of the games on this server
+games = GameRegistry()
+
+# Deadlines of this server, set by start_async_server
+timeouts = Timeouts()
+
+log = get_logger("async_server")
+
+"""
+AsyncGame class manages an individual game instance on the event loop.
+It mirrors GameThread from Server.py, but every blocking socket call is
+replaced by an awaited stream operation. Each player entry holds the
+StreamWriter as "conn" and the matching StreamReader as "reader".
+Broadcasts never wait for a player's socket: frames go into the transport's
+buffer, and a player whose buffer grows past OUTBOX_LIMIT is disconnected.
+A disconnected player keeps its seat for GRACE_PERIOD seconds to resume.
+Spectators are written to by fan_out, which runs on its own loop callback
+after the players have been sent the move.
+The lobby and turn timeouts are waits with a timeout on the event loop,
+whose timer heap plays the part of the threaded server's timer wheel.
+"""
+class AsyncGame(GameState):
+    __slots__ = ("lobby", "inbox", "readers", "task", "announced", "dropped", "away", "feed", "spectators", "fanning",
+                 "turn_deadline")
+
+    def __init__(self, game_id, creator_reader, creator_writer, creator_addr, game_size, creator_deltas=False, bots=0,
+                 win_length=WIN_LENGTH, creator_binary=False):
+        GameState.__init__(self, game_id, creator_writer, creator_addr, creator_reader, creator_deltas, creator_binary)
+        self.new_board(game_size, win_length)
+        self.seat_bots(bots)
+        self.lobby = asyncio.Event()  # Set by add_opponent once the last player has joined
+        self.inbox = asyncio.Queue()  # (player_id, message) pairs from every player while the game runs
+        self.readers = {}  # player_id -> task feeding the inbox from that player's connection
+        self.task = None  # Keeps a reference to the running game coroutine
+        self.announced = False  # Whether the creator has been sent its player id
+        self.dropped = set()  # Players disconnected as slow consumers
+        self.away = {}  # player_id -> monotonic deadline of the players whose seat is held
+        self.feed = None  # Feed of the spectators, created by the first one
+        self.spectators = {}  # StreamWriter -> seq sent to that spectator, None while it catches up
+        self.fanning = False  # Whether a fan_out is scheduled
+        self.turn_deadline = None  # Monotonic deadline of the current turn, None if it is not timed
+
+    """
+    Adds a new player to the game.
+    Sends the player its player id and seats it with a unique symbol.
+    Pushes the new player count to the creator and wakes up the game
+    coroutine once the last player has joined.
+    """
+    async def add_opponent(self, opponent_reader, opponent_writer, opponent_addr, deltas=False, binary=False):
+        #send the player its player id
+        player_id = self.num_players + 1
+        self.seat_player(opponent_writer, opponent_addr, opponent_reader, deltas, binary)
+        log.debug("Player %d joined game %d", player_id, self.game_id)
+        log.debug("Game %d has %d / %d players", self.game_id, self.num_players, self.game_size)
+        self.announce_creator()  # A joiner can get here before the game coroutine has run
+        self.creator_conn.write(encode_message({"type": "player_count", "count": self.num_players, "game_size": self.game_size}))
+        if self.num_players >= self.game_size:
+            self.lobby.set()
+        await write_message(opponent_writer, self.seat_message(player_id))
+
+    """
+    Sends the creator its player id, unless that has already been done.
+    The frame is written without awaiting, so it always reaches the creator
+    before any player count.
+    """
+    def announce_creator(self):
+        if not self.announced:
+            self.announced = True
+            self.creator_conn.write(encode_message(self.seat_message(1)))
+
+    """
+    Main game coroutine.
+    Handles player joining and starts the game when all players have connected.
+    A game whose players have not all arrived within the lobby timeout is
+    closed instead.
+    """
+    async def run(self):
+        self.announce_creator()
+        await self.creator_conn.drain()
+        log.debug("Game %d created, waiting for %d players", self.game_id, self.game_size)
+        if self.num_players < self.game_size:
+            try:  # Wait until add_opponent signals the last join
+                await asyncio.wait_for(self.lobby.wait(), timeouts.lobby or None)
+            except asyncio.TimeoutError:
+                if games.expire(self):
+                    self.reap_lobby()
+                    return
+                await self.lobby.wait()  # Every free seat is promised to a player about to arrive
+
+        log.debug("All players have joined game %d, the game is starting", self.game_id)
+        games.start(self)
+        metrics.inc("games_started")
+        await self.start_game()
+        log.debug("Game %d finished", self.game_id)
+        games.finish(self)
+        metrics.inc("games_finished")
+        self.close()
+
+    """
+    Closes a game whose players did not all arrive in time. The players
+    already seated and the spectators are told.
+    """
+    def reap_lobby(self):
+        metrics.inc("games_reaped")
+        log.info("Game %d timed out waiting for its players", self.game_id)
+        self.end_game({"type": "game_over", "reason": "timeout", "player": None})
+        self.close()
+
+    """
+    Sends the update for the move just played at (row, col) to all players,
+    as built by update_frames.
+    """
+    def send_update(self, row, col):
+        self.write_frames(self.update_frames(row, col))
+
+    """
+    Reads messages from one player connection and puts them in the game inbox.
+    Messages beyond the connection's rate limit are dropped here. The
+    reader yields to the event loop after each dropped message, since
+    buffered frames are read without ever waiting, so a flood cannot hold
+    up the other games.
+    A lost connection puts the player away, unless the player has resumed on
+    another connection meanwhile.
+    """
+    async def read_player(self, player_id):
+        player = self.players[player_id]
+        reader, writer = player["reader"], player["conn"]
+        bucket = TokenBucket()
+        while True:
+            try:
+                message = await read_message(reader)
+            except (OSError, asyncio.IncompleteReadError, ProtocolError) as e:
+                if not self.game_over and player["conn"] is writer:
+                    log.warning("Error communicating with Player %d: %s", player_id, e)
+                    self.hold_seat(player_id)
+                return
+            if not bucket.take():
+                metrics.inc("messages_rate_limited")
+                await asyncio.sleep(0)
+                continue
+            await self.inbox.put((player_id, message))
+            if message["type"] == "exit":
+                return
+
+    """
+    Starts the search for the move of the bot whose turn it is, if any.
+    The search runs in the bots' process pool, off the event loop; once it
+    is done, the bot's move goes into the inbox like any other player's.
+    """
+    def ask_bot(self):
+        if not self.bot_turn():
+            return
+        player_id = self.turn
+        asked_at = time.perf_counter()
+
+        def done(future):
+            metrics.observe("bot_move", time.perf_counter() - asked_at)
+            metrics.inc("bot_moves")
+            self.inbox.put_nowait((player_id, self.searched_move(future)))
+
+        future = asyncio.wrap_future(submit_search(self.board.cells[:], self.board.size, self.board.win_length,
+                                                   player_id, self.game_size))
+        future.add_done_callback(done)
+
+    """
+    Holds the seat of a player whose connection was lost for GRACE_PERIOD
+    seconds and tells the others. The player can resume meanwhile.
+    """
+    def hold_seat(self, player_id):
+        player = self.players[player_id]
+        player["conn"].close()
+        player.update(conn=None, reader=None)
+        self.away[player_id] = time.monotonic() + GRACE_PERIOD
+        self.inbox.put_nowait((player_id, None))  # Wakes recv_move to watch the new deadline
+        metrics.inc("players_away")
+        log.info("Player %d of game %d is away, holding its seat for %d seconds", player_id, self.game_id, GRACE_PERIOD)
+        self.notify_players({"type": "player_away", "player": player_id, "grace": GRACE_PERIOD})
+
+    """
+    Returns a player to its seat on a new connection, given the seat token,
+    and sends it the frame built by resume_frame. A connection still open
+    for the seat is replaced.
+    Returns the player id, or None if the token holds no seat in this game.
+    """
+    def resume_seat(self, reader, writer, addr, token, last_seq, deltas=False, binary=False):
+        if self.status != 'in_progress' or self.game_over:
+            return None
+        for player_id, player in self.players.items():
+            if player["token"] == token:
+                break
+        else:
+            return None
+        if player["conn"] is not None:
+            self.readers[player_id].cancel()
+            player["conn"].transport.abort()
+        self.away.pop(player_id, None)
+        self.dropped.discard(player_id)
+        player.update(conn=writer, addr=addr, reader=reader, deltas=deltas, binary=binary)
+        if player_id == 1:
+            self.creator_conn, self.creator_addr = writer, addr
+        self.readers[player_id] = asyncio.create_task(self.read_player(player_id))
+
+        frame, replayed = self.resume_frame(player_id, last_seq, deltas, binary)
+        self.write_frames({player_id: frame})
+        metrics.inc("moves_replayed", replayed)
+        log.info("Player %d resumed game %d at seq %s of %d", player_id, self.game_id, last_seq, self.seq)
+        data = encode_message({"type": "player_back", "player": player_id})
+        self.write_frames({other: data for other in self.players if other != player_id})
+        return player_id
+
+    """
+    Waits for the player whose turn it is to play a move.
+    Serves resync requests from any player in the meantime, and answers
+    moves that cannot be played with invalid_move.
+    Returns (player_id, message) for a legal move, for the exit message of
+    any player that left, an exit for a player whose grace period ran out, or
+    a timeout for the player whose turn ran out.
+    """
+    async def recv_move(self):
+        while True:
+            now = time.monotonic()
+            for player_id, deadline in self.away.items():
+                if deadline <= now:
+                    log.info("Player %d of game %d did not come back in time", player_id, self.game_id)
+                    return player_id, {"type": "exit"}
+            if self.turn_deadline is not None and self.turn_deadline <= now:
+                return self.turn, {"type": "timeout"}
+            deadlines = list(self.away.values())
+            if self.turn_deadline is not None:
+                deadlines.append(self.turn_deadline)
+            timeout = min(deadlines) - now if deadlines else None
+            try:
+                player_id, message = await asyncio.wait_for(self.inbox.get(), timeout)
+            except asyncio.TimeoutError:
+                continue
+            if message is None:
+                continue  # A player went away
+            if message["type"] == "exit":
+                return player_id, message
+            if message["type"] == "resync":
+                metrics.inc("resyncs")
+                self.write_frames({player_id: encode_message(self.snapshot_message(), self.players[player_id]["binary"])})
+            elif message["type"] == "move":
+                error = self.move_error(player_id, message)
+                if error is None:
+                    return player_id, message
+                metrics.inc("moves_rejected")
+                log.debug("Rejecting move of Player %d: %s", player_id, error)
+                self.write_frames({player_id: REJECTIONS[error]})
+            else:
+                metrics.inc("messages_ignored")
+                log.debug("Ignoring unexpected message from Player %d: %s", player_id, message)
+
+    """
+    Starts the timeout of the turn that has just begun. Bots always move
+    within their search budget, so their turns are not timed.
+    """
+    def time_turn(self):
+        if timeouts.turn and self.turn is not None and not self.bot_turn():
+            self.turn_deadline = time.monotonic() + timeouts.turn
+        else:
+            self.turn_deadline = None
+
+    """
+    Manages the main game loop.
+    Handles player turns, move validation, and win condition checking.
+    Continues until the game is over (win, tie, or player disconnection).
+    """
+    async def start_game(self):
+        log.debug("Game %d has started", self.game_id)
+        self.readers = {player_id: asyncio.create_task(self.read_player(player_id))
+                        for player_id, player in self.players.items() if not player["bot"]}
+        self.turn = 1 #first turn is for player 1 the creator of the game
+        self.notify_players(self.snapshot_message())
+        self.ask_bot()
+        self.time_turn()
+        while(self.game_over==False):
+            player_id, turn = await self.recv_move()
+            received_at = time.perf_counter()
+            if (turn["type"] == "timeout"): #the player to move is still told, along with the others
+                metrics.inc("turns_timed_out")
+                log.info("Player %d of game %d ran out of time", player_id, self.game_id)
+                self.turn = None
+                self.end_game({"type": "game_over", "reason": "timeout", "player": player_id})
+                break
+            if (turn["type"] == "exit"): #disconnect player from server and end the game
+                metrics.inc("players_left")
+                player = self.players.pop(player_id)
+                self.away.pop(player_id, None)
+                if player["conn"] is not None:
+                    player["conn"].close()
+                self.num_players=self.num_players-1
+                self.turn = None
+                self.end_game({"type": "game_over", "reason": "left", "player": player_id})
+                break
+            row, col = int(turn["row"]), int(turn["col"])
+            with metrics.timer("check_winner"):
+                result = self.play_turn(row, col)  # Only the lines through the new cell are checked
+            self.send_update(row, col)
+            if self.feed is not None:
+                self.publish(row, col)
+            self.ask_bot()
+            self.time_turn()
+            metrics.observe("move", time.perf_counter() - received_at)
+            metrics.inc("moves")
+            if(result==self.players[player_id]["symbol"]):
+                self.end_game({"type": "game_over", "reason": "won", "player": player_id})
+                break
+
+            if (result == "Tie"):
+                self.end_game({"type": "game_over", "reason": "tie", "player": None})
+                break
+
+    """
+    Sends the game_over message to the players and the spectators.
+    """
+    def end_game(self, message):
+        self.notify_players(message)
+        self.game_over = True
+        if self.feed is not None:
+            self.close_spectators(message)
+
+    """
+    Adds a spectator and sends it the current board.
+    The transport pauses as soon as anything is buffered, so drain() in
+    catch_up waits until the spectator has read everything.
+    """
+    def watch(self, writer):
+        if self.feed is None:
+            self.feed = Feed(self)
+        writer.transport.set_write_buffer_limits(high=0)
+        writer.write(self.feed.snapshot_frame())
+        self.spectators[writer] = self.feed.seq
+
+    """
+    Hands the move just played to the spectators. Moves played before the
+    scheduled fan_out runs go out together.
+    """
+    def publish(self, row, col):
+        self.feed.apply(row, col, self.board.get(row, col), self.seq, self.turn)
+        if not self.fanning:
+            self.fanning = True
+            asyncio.get_running_loop().call_soon(self.fan_out)
+
+    """
+    Writes the latest move to every spectator that is up to date, the same
+    bytes to each. A spectator that has a move missing gets a snapshot, and
+    one that is still sending earlier frames skips the move and gets a
+    snapshot from catch_up once its buffer has drained.
+    """
+    def fan_out(self):
+        self.fanning = False
+        feed = self.feed
+        with metrics.timer("spectator_broadcast"):
+            for writer, seq in list(self.spectators.items()):
+                if seq is None or seq == feed.seq:
+                    continue
+                if writer.is_closing():
+                    del self.spectators[writer]
+                elif writer.transport.get_write_buffer_size():
+                    metrics.inc("spectator_updates_coalesced")
+                    self.spectators[writer] = None
+                    asyncio.create_task(self.catch_up(writer))
+                else:
+                    writer.write(feed.delta if seq == feed.seq - 1 else feed.snapshot_frame())
+                    self.spectators[writer] = feed.seq
+
+    """
+    Waits until a spectator has read its buffered frames, then sends it a
+    snapshot of the latest board.
+    """
+    async def catch_up(self, writer):
+        try:
+            await writer.drain()
+        except ConnectionError:
+            self.spectators.pop(writer, None)
+            return
+        if writer in self.spectators:
+            writer.write(self.feed.snapshot_frame())
+            self.spectators[writer] = self.feed.seq
+
+    """
+    Sends the spectators the latest board if they lag behind and the
+    game_over message, then closes their connections.
+    """
+    def close_spectators(self, message):
+        frame = encode_message(message)
+        loop = asyncio.get_running_loop()
+        for writer, seq in self.spectators.items():
+            if writer.is_closing():
+                continue
+            writer.write(frame if seq == self.feed.seq else self.feed.snapshot_frame() + frame)
+            writer.close()
+            loop.call_later(CLOSE_FLUSH_TIMEOUT, writer.transport.abort)
+        self.spectators = {}
+
+    """
+    Sends a message to all connected players, as built by message_frames.
+    """
+    def notify_players(self, message):
+        self.write_frames(self.message_frames(message))
+
+    """
+    Writes one encoded frame per player without waiting for it to be sent.
+    The transports buffer whatever their sockets do not take at once. A
+    player whose buffer would grow past OUTBOX_LIMIT is dropped as a slow
+    consumer, so it can never hold up the game.
+    """
+    def write_frames(self, frames):
+        start = time.perf_counter()
+        for player_id, data in frames.items():
+            writer = self.players[player_id]["conn"]
+            if writer is None or writer.is_closing():
+                continue  # Away, or its reader task reports the lost connection
+            queued = writer.transport.get_write_buffer_size()
+            if queued and queued + len(data) > OUTBOX_LIMIT:
+                self.drop_player(player_id, queued)
+            else:
+                writer.write(data)
+        metrics.observe("broadcast", time.perf_counter() - start)
+
+    """
+    Disconnects a slow consumer. Its reader task then sees the connection
+    lost and puts the player away, so it can resume once it reads again.
+    """
+    def drop_player(self, player_id, queued):
+        if player_id in self.dropped:
+            return
+        self.dropped.add(player_id)
+        metrics.inc("players_dropped")
+        log.warning("Dropping Player %d of game %d with %d bytes queued", player_id, self.game_id, queued)
+        self.players[player_id]["conn"].transport.abort()
+
+    """
+    Closes the connections of all remaining players once the game is over.
+    Queued bytes keep draining in the background for CLOSE_FLUSH_TIMEOUT
+    seconds before the connection is cut.
+    """
+    def close(self):
+        for reader in self.readers.values():
+            reader.cancel()
+        loop = asyncio.get_running_loop()
+        for player in self.players.values():
+            if player["conn"] is None:
+                continue
+            player["conn"].close()
+            loop.call_later(CLOSE_FLUSH_TIMEOUT, player["conn"].transport.abort)
+
+"""
+Creates a new game instance for the connecting client and starts its coroutine.
+Returns a dictionary containing game information including game_id, creator, and board.
+Registers the new game instance in the global games registry.
+The next `bots` seats after the creator's go to server-side bot players,
+and win_length pieces in a row win the game.
+"""
+def create_new_game(reader, writer, addr, game_size, deltas=False, bots=0, win_length=WIN_LENGTH, binary=False):
+    game = games.create(lambda game_id: AsyncGame(game_id, reader, writer, addr, game_size, deltas, bots, win_length,
+                                                  binary))
+    game.task = asyncio.create_task(game.run())  # Start the game coroutine
+    return {"game_id": game.game_id, "creator": addr, "board": game.board}
+
+"""
+Reads one request of a connection's handshake, giving up once the
+handshake timeout has passed so that a client that never sends anything
+does not hold its connection open forever.
+"""
+async def read_handshake(reader, addr):
+    try:
+        return await asyncio.wait_for(read_message(reader), timeouts.handshake or None)
+    except asyncio.TimeoutError:
+        metrics.inc("handshakes_reaped")
+        log.info("[HANDSHAKE TIMEOUT] on address: %s", addr)
+        raise
+
+"""
+Handles initial client connection and game setup.
+Processes requests for creating new games, joining existing ones, or
+being matched into any game of a given size.
+Called by asyncio for every accepted connection.
+"""
+async def handle_client(reader, writer):
+    addr = writer.get_extra_info('peername')
+    metrics.inc("connections_accepted")
+    log.debug("[CLIENT CONNECTED] on address: %s", addr)
+
+    try:
+        request = await read_handshake(reader, addr)
+        #case for listing the games before joining one
+        if (request["type"] == "list"):
+            available_games = games.waiting_ids()
+            log.debug("The following available game rooms are: %s", available_games)
+
+            # Check if there are any available games
+            if not available_games:
+                await write_message(writer, {"type": "error", "message": "No available games at the moment."})
+                writer.close()
+                return
+            await write_message(writer, {"type": "games", "games": available_games})
+            request = await read_handshake(reader, addr)
+
+        deltas = bool(request.get("deltas"))
+        binary = bool(request.get("binary"))  # Boards, deltas and moves as binary payloads
+        #case for returning to a seat after a disconnect
+        if (request["type"] == "resume"):
+            game = games.get(int(request["game_id"]))
+            last_seq = request.get("last_seq")
+            last_seq = None if last_seq is None else int(last_seq)
+            if game is None or game.resume_seat(reader, writer, addr, str(request["token"]), last_seq, deltas,
+                                                binary) is None:
+                metrics.inc("resumes_rejected")
+                await write_message(writer, {"type": "error", "message": "No seat to return to"})
+                writer.close()
+            else:
+                metrics.inc("resumes")
+
+        #case for watching a game without playing in it
+        elif (request["type"] == "watch"):
+            game = games.get(int(request["game_id"]))
+            if game is None or game.game_over:
+                await write_message(writer, {"type": "error", "message": "Invalid game ID"})
+                writer.close()
+            else:
+                game.watch(writer)
+                metrics.inc("spectators_joined")
+
+        #case for joining an existing game
+        elif (request["type"] == "join"):
+            game_id = int(request["game_id"])
+            log.debug("Client wants to join game %d", game_id)
+            game = games.get(game_id)
+            if game is None:
+                metrics.inc("joins_rejected")
+                await write_message(writer, {"type": "error", "message": "Invalid game ID"})
+                writer.close()
+            elif not games.reserve_seat(game):
+                metrics.inc("joins_rejected")
+                await write_message(writer, {"type": "error", "message": "The game is already full"})
+                writer.close()
+            else:
+                with metrics.timer("join"):
+                    await game.add_opponent(reader, writer, addr, deltas, binary)
+                metrics.inc("joins")
+
+        elif (request["type"] in ("create", "match")):
+            game_size = int(request["game_size"])
+            if game_size < 1:
+                await write_message(writer, {"type": "error", "message": "Invalid number of players"})
+                writer.close()
+                return
+            # Matched games are found by size alone, so they always get the default length
+            win_length = default_win_length(game_size)
+            if (request["type"] == "create"):
+                win_length = int(request.get("win_length", win_length))
+            if not 2 <= win_length <= game_size + 1:
+                await write_message(writer, {"type": "error", "message": "Invalid win length"})
+                writer.close()
+                return
+            if (request["type"] == "create"):
+                bots = int(request.get("bots", 0))
+                if not 0 <= bots < game_size:
+                    await write_message(writer, {"type": "error", "message": "Invalid number of bots"})
+                    writer.close()
+                    return
+                log.debug("Creating a new game")
+                create_new_game(reader, writer, addr, game_size, deltas, bots, win_length, binary) #creates a new game coroutine
+                metrics.inc("games_created")
+                metrics.inc("bots_seated", bots)
+            else:
+                #case for matchmaking: take a seat in any waiting game of this size
+                game, created = games.match(game_size, lambda game_id: AsyncGame(game_id, reader, writer, addr, game_size, deltas,
+                                                                                 win_length=win_length, creator_binary=binary))
+                log.debug("Matched client into game %d", game.game_id)
+                metrics.inc("matches")
+                if created:
+                    game.task = asyncio.create_task(game.run())  # Start the game coroutine
+                    metrics.inc("games_created")
+                else:
+                    with metrics.timer("join"):
+                        await game.add_opponent(reader, writer, addr, deltas, binary)
+                    metrics.inc("joins")
+
+        else:
+            metrics.inc("requests_rejected")
+            await write_message(writer, {"type": "error", "message": "Unknown request"})
+            writer.close()
+
+    except Exception:
+        log.info("[CLIENT CONNECTION INTERRUPTED] on address: %s", addr)
+        writer.close()
+
+"""
+Initializes and starts the asyncio server.
+Listens for incoming connections and serves every client from the event loop.
+"""
+async def start_async_server(host=HOST, port=PORT, server_timeouts=None):
+    global timeouts
+    if server_timeouts is not None:
+        timeouts = server_timeouts
+    server = await asyncio.start_server(handle_client, host, port, backlog=1024)
+    metrics.gauge("games_active", lambda: len(games))
+    log.info("[LISTENING] async server is listening on %s:%d", host, port)
+    async with server:
+        await server.serve_forever()
+
+
+"""
+SIGTERM handler: stops the bots' worker processes and exits right away.
+"""
+def shutdown(signum, frame):
+    shutdown_pool()
+    os._exit(0)
+
+# Server initialization code
+# Main
+if __name__ == '__main__':
+    signal.signal(signal.SIGTERM, shutdown)
+    setup_logging()
+    log.info("[STARTING] async server is starting...")
+    asyncio.run(start_async_server())
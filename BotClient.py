@@ -0,0 +1,88 @@
+"""
+This module implements a headless Tic Tac Toe client for bots and load tests.
+A Bot is a GameClient from Client.py that answers every turn by itself, so
+thousands of bots can play from a single event loop.
+Bots play random legal moves and time the round trip of every move.
+A bot created with binary=True uses the binary encoding of boards, deltas
+and moves instead of JSON.
+"""
+
+# Imports
+import asyncio
+import random
+import time
+
+from Client import HOST, PORT, GameClient
+
+"""
+Bot class plays one seat of one game over its own connection.
+Besides the client's board it keeps the list of free cells, fed by the same
+snapshots and deltas, and answers every turn with a random free cell.
+"""
+class Bot(GameClient):
+    __slots__ = ("rng", "free", "moves", "latencies")
+
+    def __init__(self, host=HOST, port=PORT, rng=None, binary=False):
+        GameClient.__init__(self, host, port, binary)
+        self.rng = rng or random.Random()
+        self.free = []  # Cells (row, col) still empty on the local board
+        self.moves = 0  # Number of moves this bot has played
+        self.latencies = []  # Seconds from sending each move until its delta arrived
+
+    """
+    Applies a message to the board, and to the free cells.
+    """
+    def apply(self, message):
+        seq = self.seq
+        if not GameClient.apply(self, message):
+            return False
+        if (message["type"] == "board"):
+            self.free = [(row, col) for row, line in enumerate(message["board"])
+                         for col, symbol in enumerate(line) if symbol == " "]
+        elif (message["type"] == "delta" and message["seq"] == seq + 1):
+            self.free.remove((message["row"], message["col"]))
+        return True
+
+    """
+    Plays a random free cell and returns the time the move was sent.
+    """
+    async def random_move(self):
+        row, col = self.free[self.rng.randrange(len(self.free))]
+        sent_at = time.perf_counter()
+        self.moves += 1
+        await self.move(row, col)
+        return sent_at
+
+    """
+    Plays until the game is over and returns the game_over message.
+    A move's latency runs from sending it until the next delta arrives,
+    which is the one that carries it.
+    After a resume the bot moves first if the server is waiting for it.
+    """
+    async def play(self):
+        sent_at = await self.random_move() if self.turn == self.player_id and self.free else None
+        async for message in self.events():
+            if (message["type"] == "delta"):
+                if sent_at is not None:
+                    self.latencies.append(time.perf_counter() - sent_at)
+                    sent_at = None
+            elif (message["type"] not in ("board", "invalid_move")):
+                continue  # Player counts and other notices do not change the board
+            if self.turn == self.player_id and self.free:
+                sent_at = await self.random_move()
+        return self.result
+
+"""
+Plays one complete game with game_size bots: the first bot creates the game
+and the others join it by id. Returns the list of bots once the game is over.
+"""
+async def play_bot_game(game_size, host=HOST, port=PORT, rng=None):
+    bots = [Bot(host, port, rng) for _ in range(game_size)]
+    try:
+        await bots[0].create(game_size)
+        await asyncio.gather(*(bot.join(bots[0].game_id) for bot in bots[1:]))
+        await asyncio.gather(*(bot.play() for bot in bots))
+    finally:
+        for bot in bots:
+            bot.close()
+    return bots
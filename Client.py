@@ -1,215 +1,439 @@
 """
 This is the client-side implementation of a Tic Tac Toe game.
-It handles player connections, game interaction, and communication with the server.
+GameClient talks to the server on asyncio and keeps a local model of the
+board, so bots, tests and load generators can run many clients in one
+process. The command line client at the bottom of this module is a thin
+wrapper around it that prints the board and asks the player for moves.
 """
 
-import socket
-import time
-import json
+import asyncio
 import sys
 
+from Protocol import read_message, write_message
+
 HOST = '127.0.0.1'  # The server's hostname or IP address
 PORT = 5000  # The port used by the server
-FORMAT = 'utf-8'
 ADDR = (HOST, PORT)  # Creating a tuple of IP+PORT
+RECONNECT_ATTEMPTS = 30  # Tries to get back to our seat after losing the server
+RECONNECT_DELAY = 1  # Seconds between two tries
+
+"""
+GameClient class is one connection to the server: a seat in a game, or a
+spectator of one. Requests are coroutines, and events() is the stream of
+messages pushed by the server.
+The local board starts from the server's snapshot and is updated by the
+per-move deltas. If a delta's sequence number shows that a move was missed,
+a fresh snapshot is requested instead of applying it.
+Moves, deltas and boards use the binary encoding unless binary is False.
+"""
+class GameClient:
+    __slots__ = ("host", "port", "binary", "reader", "writer", "player_id", "game_id", "token",
+                 "board", "seq", "turn", "result")
+
+    def __init__(self, host=HOST, port=PORT, binary=True):
+        self.host = host
+        self.port = port
+        self.binary = binary
+        self.reader = None
+        self.writer = None
+        self.player_id = None  # Seat in the game, known once the server answers
+        self.game_id = None
+        self.token = None  # Resumes the seat after a lost connection or a server restart
+        self.board = None  # Matrix of symbols, with " " for empty cells, once the first snapshot arrived
+        self.seq = 0  # Number of moves on the local board
+        self.turn = None  # Player to move next, as of the last message
+        self.result = None  # The game_over message once the game has ended
+
+    """
+    Opens a connection to the server, unless one is open already.
+    """
+    async def connect(self):
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+
+    async def send(self, message):
+        await write_message(self.writer, message, self.binary)
+
+    """
+    Returns the ids of the games waiting for players.
+    The connection stays open, so a join can follow on it.
+    """
+    async def list_games(self):
+        await self.connect()
+        await self.send({"type": "list"})
+        message = await read_message(self.reader)
+        if message["type"] != "games":
+            self.close()
+            return []
+        return message["games"]
+
+    """
+    Sends the first request of a seat on a new connection, or on the one
+    left open by list_games.
+    """
+    async def send_request(self, request):
+        await self.connect()
+        request["deltas"] = True
+        request["binary"] = self.binary
+        await self.send(request)
+
+    """
+    Sends the given request and waits for the seat.
+    Returns the player id. Raises ConnectionError if the server refuses.
+    """
+    async def request_seat(self, request):
+        await self.send_request(request)
+        message = await read_message(self.reader)
+        if message["type"] != "player_id":
+            self.close()
+            raise ConnectionError(message.get("message", f"Unexpected reply {message}"))
+        self.apply(message)
+        return self.player_id
+
+    """
+    Creates a new game for game_size players and returns the player id.
+    bots of the other seats are played by the server, and win_length pieces
+    in a row win, or the server's default if None.
+    """
+    async def create(self, game_size, bots=0, win_length=None):
+        request = {"type": "create", "game_size": game_size, "bots": bots}
+        if win_length is not None:
+            request["win_length"] = win_length
+        return await self.request_seat(request)
+
+    """
+    Joins the game with the given id and returns the player id.
+    """
+    async def join(self, game_id):
+        return await self.request_seat({"type": "join", "game_id": game_id})
+
+    """
+    Joins any waiting game for game_size players and returns the player id.
+    """
+    async def match(self, game_size):
+        return await self.request_seat({"type": "match", "game_size": game_size})
+
+    def resume_request(self):
+        return {"type": "resume", "game_id": self.game_id, "token": self.token, "last_seq": self.seq}
+
+    """
+    Returns to this client's seat on a new connection, after losing the old
+    one or after a server restart. The server replays the moves after self.seq.
+    """
+    async def resume(self):
+        self.close()
+        return await self.request_seat(self.resume_request())
+
+    """
+    Follows the game with the given id as a spectator. The snapshot and the
+    moves arrive through events(); an unknown or finished game ends it with
+    a ConnectionError.
+    """
+    async def watch(self, game_id):
+        await self.connect()
+        self.game_id = game_id
+        await self.send({"type": "watch", "game_id": game_id})
+
+    """
+    Plays the given cell. The server answers with the delta of the move, or
+    with an invalid_move message.
+    """
+    async def move(self, row, col):
+        await self.send({"type": "move", "row": row, "col": col})
+
+    """
+    Asks the server for a fresh snapshot of the board.
+    """
+    async def resync(self):
+        await self.send({"type": "resync"})
+
+    """
+    Tells the server this player leaves the game, which ends it for everyone.
+    """
+    async def leave(self):
+        await self.send({"type": "exit"})
+
+    """
+    Tries to resume the seat every delay seconds, until the server is back.
+    Only the request is sent: the answer arrives through events().
+    Returns False if the server did not come back.
+    """
+    async def reconnect(self, attempts=RECONNECT_ATTEMPTS, delay=RECONNECT_DELAY):
+        for _ in range(attempts):
+            await asyncio.sleep(delay)
+            self.close()
+            try:
+                await self.send_request(self.resume_request())
+            except OSError:
+                self.close()
+                continue  # The server is not back yet
+            return True
+        return False
+
+    """
+    Updates the local model with a message from the server.
+    Returns False for a delta that does not follow the local board, in which
+    case the board is left as it was.
+    """
+    def apply(self, message):
+        kind = message["type"]
+        if (kind == "board"):
+            self.board = message["board"]
+        elif (kind == "delta"):
+            if self.board is None or message["seq"] > self.seq + 1:
+                return False  # Missed a move
+            if message["seq"] <= self.seq:
+                return True  # Already part of the last snapshot
+            self.board[message["row"]][message["col"]] = message["symbol"]
+        elif (kind == "player_id"):
+            self.player_id = message["player_id"]
+            self.game_id = message["game_id"]
+            self.token = message.get("token")
+            if message.get("seq") == self.seq:
+                self.turn = message["turn"]  # Resumed without missing a move
+            return True
+        elif (kind == "game_over"):
+            self.result = message
+            return True
+        else:
+            return True
+        self.seq = message["seq"]
+        self.turn = message["turn"]
+        return True
+
+    """
+    Async iterator over the messages pushed by the server, each one applied
+    to the local model before it is yielded. A delta that does not follow
+    the local board is not yielded: a snapshot is requested instead, and
+    one the snapshot already held is dropped.
+    Stops after the game_over message. Raises ConnectionError on an error
+    message, and when the connection is lost.
+    With reconnect=True a lost seat is resumed instead: a local
+    {"type": "disconnected"} event is yielded, then the server's answer to
+    the resume.
+    """
+    async def events(self, reconnect=False):
+        while self.result is None:
+            try:
+                message = await read_message(self.reader)
+            except (OSError, asyncio.IncompleteReadError):
+                if not reconnect or self.token is None:
+                    raise ConnectionError("Lost the connection to the server.")
+                yield {"type": "disconnected"}
+                if not await self.reconnect():
+                    raise ConnectionError("Could not get back into the game.")
+                continue
+            if (message["type"] == "error"):
+                self.close()
+                raise ConnectionError(message["message"])
+            if (message["type"] == "delta" and self.board is not None and message["seq"] <= self.seq):
+                continue  # Already part of the last snapshot
+            if not self.apply(message):
+                await self.resync()
+                continue
+            yield message
+
+    """
+    Closes the connection to the server.
+    """
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            self.reader = self.writer = None
+
+"""
+Asks the player a question without blocking the event loop.
+"""
+async def ask(prompt):
+    return await asyncio.to_thread(input, prompt)
 
 """
 Handles the game exit process by sending an exit signal to the server,
-closing the client socket, and terminating the program gracefully.
+closing the connection, and terminating the program gracefully.
 """
-def exit_game():
+async def exit_game(client):
     print("Exiting the game.")
-    client_socket.send("e".encode(FORMAT))
-    client_socket.close()  # Close the client socket
+    await client.leave()
+    client.close()  # Close the client socket
     sys.exit("Player has exited the game.")  # Terminate the program
 
 """
-Converts the server's string representation of the game board into a matrix format.
-Takes a message string as input and returns either a matrix representation of the board
-or None if the message is not a valid board format.
+Prints the board received from the server.
+Takes the board as a matrix of symbols, with " " for empty cells.
 """
-def parse_game_board(message):
-    """Parse the game board from the message and return a matrix."""
-    if message.startswith("Current Board:"):
-        # Extract the board part of the message after "Current Board:"
-        board_str = message.split("Current Board:")[1].strip()
-
-        # Split the board string into rows
-        rows = board_str.split('\n')
+def print_board(board):
+    print("Current Board:")
+    for row in board:
+        print(" | ".join(row))  # Nicely format the rows with separators
+    print()
 
-        # Initialize an empty matrix
-        matrix = []
+"""
+Prints how a game ended.
+"""
+def print_result(message):
+    if (message["reason"] == "won"):
+        print(f"player {message['player']} won")
+    elif (message["reason"] == "tie"):
+        print("Tie")
+    elif (message["reason"] == "timeout"):
+        if message["player"] is None:
+            print("The game timed out waiting for players")
+        else:
+            print(f"player {message['player']} ran out of time")
+    else:
+        print(f"player {message['player']} left the game")
 
-        for row in rows:
-            # Split each row by ' | ' and strip spaces around each element
-            row_values = [cell.strip() for cell in row.split('|')]
-            matrix.append(row_values)
+"""
+Asks the player for a move until a valid one is entered, and plays it.
+"""
+async def send_move(client):
+    board = client.board
+    while True:  # Keep asking for input until valid input is provided
+        move = await ask("Enter your move in the format (row,col):\nPress e to exit game\n")
+        if (move == 'e'):
+            await exit_game(client)
+        move = move.strip('()')
+        # Check if input can be split into exactly two integers
+        try:
+            row, col = map(int, move.split(','))
 
-        return matrix
-    else:
-        return None
+            # Check if the row and col are within the valid range
+            if 0 <= row <= (len(board)-1) and 0 <= col <= (len(board)-1):
+                if (board[row][col]==" "):
+                    break  # Valid input, exit the loop
+                else:
+                    print("Invalid move! The spot is already taken.")
+            else:
+                print(f"Invalid move! Row and column must be between 0 and {len(board)-1}.")
+        except ValueError:
+            print("Invalid input format! Please enter the move as (row,col) with integers.")
+    try:
+        await client.move(row, col)
+    except OSError:
+        pass  # The next read notices the lost connection
 
 """
-Validates whether a received message contains a valid game board structure.
-Checks if the message can be parsed as JSON and contains required game board components.
-Returns True if message is a valid game board, False otherwise.
+Runs the game loop once the player has a seat.
+Prints every update pushed by the server until the game is over, and asks
+for a move whenever it is this player's turn. If the connection to the
+server is lost, the player resumes the same seat and only receives the
+moves it missed meanwhile.
 """
-def is_game_board(message):
-    """Check if the message is a game board (based on expected structure)."""
+async def play_game(client):
+    started = False
     try:
-        game = json.loads(message)
-        if "game_id" in game and "creator" in game and "board" in game:
-            return True
-        return False
-    except json.JSONDecodeError:
-        return False
+        async for message in client.events(reconnect=True):
+            if (message["type"] == "player_count"):
+                print(f"number of connected players: {message['count']}/{message['game_size']}")
+                continue
+            elif (message["type"] == "player_away"):
+                print(f"player {message['player']} lost the connection, holding its seat for {message['grace']} seconds")
+                continue
+            elif (message["type"] == "player_back"):
+                print(f"player {message['player']} is back")
+                continue
+            elif (message["type"] == "disconnected"):
+                print("Lost the connection to the server, trying to get back into the game...")
+                continue
+            elif (message["type"] == "player_id"):
+                if client.board is None or message.get("seq") != client.seq:
+                    continue  # The missed moves or a fresh snapshot follow
+            elif (message["type"] == "invalid_move"):
+                print(f"Invalid move! {message['message']}")
+                if client.board is not None and client.turn == client.player_id:
+                    await send_move(client)
+                continue
+            elif (message["type"] == "game_over"):
+                print_result(message)
+                continue
+            elif (message["type"] == "board"):
+                if not started:
+                    print("Starting game")
+                    started = True
+            elif (message["type"] != "delta"):
+                continue
+            print_board(client.board)
+            if client.turn is not None:
+                print(f"player {client.turn} turn")
+            if (client.turn == client.player_id):
+                await send_move(client)
+    except ConnectionError as e:
+        print(e)
 
 """
-Displays the current game board in a readable format.
-Takes a game dictionary containing creator, game_id, and board information.
-Prints the formatted board to the console.
+Follows a game as a spectator and prints the board after every move
+until the game is over. The server sends a fresh snapshot instead of the
+moves a spectator missed, so a delta always follows the board we have.
 """
-def print_game_board(game):
-    """Print the game board in a readable format."""
-    print("\nReceived game board:")
-    print(f"Creator: {game['creator']}")
-    print(f"Game ID: {game['game_id']}")
-    print("Board:")
-    for row in game['board']:
-        print(" | ".join(row))  # Nicely format the rows with separators
-    print("\n")
+async def watch_game(client):
+    try:
+        async for message in client.events():
+            if (message["type"] == "game_over"):
+                print_result(message)
+            elif (message["type"] in ("board", "delta")):
+                print_board(client.board)
+                if client.turn is not None:
+                    print(f"player {client.turn} turn")
+    except ConnectionError as e:
+        print(e)
 
 """
 Main client function that handles the entire game flow from the client side.
-Manages connection to server, game creation/joining, and game interaction.
-Handles player moves and processes server responses.
+Lets the player pick a game to create, join or watch, then plays it.
 """
-def start_client():
-    client_socket.connect((HOST, PORT))
-
-    Choose_Game = input("Press 1 to join an existing game\nPress 2 to create a new game\n")
-    client_socket.send(Choose_Game.encode(FORMAT))
+async def start_client():
+    client = GameClient()
+    Choose_Game = await ask("Press 1 to join an existing game\nPress 2 to create a new game\nPress 3 to join any game\n"
+                            "Press 4 to watch a game\n")
     Choose_Game = int(Choose_Game)
 
-    if Choose_Game == 1:
-        # Joining an existing game
-        games_json = client_socket.recv(1024).decode(FORMAT)
-        print(games_json)
-        if (games_json == 'No available games at the moment.'):
+    try:
+        if Choose_Game == 1:
+            # Joining an existing game
+            available_games = await client.list_games()
+            if not available_games:
+                print("No available games at the moment.")
+                return
+            print(f"The following game rooms are available: {available_games}")
+
+            game_id = await ask("Please enter the game ID you want to join: ")
+            if int(game_id) not in available_games:
+                print("Invalid game ID. Exiting.")
+                return
+            await client.join(int(game_id))
+
+        elif Choose_Game == 2:
+            # Creating a new game
+            game_size = await ask("Enter number of players for the game\n")
+            bots = await ask("How many of the other players should the computer play? (0 for none)\n")
+            win_length = await ask("How many in a row win the game? (3 if left empty)\n")
+            print("Waiting for other players to join...")
+            await client.create(int(game_size), int(bots or 0), int(win_length or 3))
+
+        elif Choose_Game == 3:
+            # Let the server seat us in any game of the requested size
+            game_size = await ask("Enter number of players for the game\n")
+            await client.match(int(game_size))
+
+        elif Choose_Game == 4:
+            # Follow a game without playing in it
+            game_id = await ask("Please enter the game ID you want to watch: ")
+            await client.watch(int(game_id))
+            await watch_game(client)
             return
-        available_games = json.loads(games_json)
-        print(f"The following game rooms are available: {available_games}")
 
-        game_id = input("Please enter the game ID you want to join: ")
-        if int(game_id) not in available_games:
-            print("Invalid game ID. Exiting.")
+        else:
             return
 
-        time.sleep(0.5)
-        client_socket.send(game_id.encode(FORMAT))
-        player_number = client_socket.recv(1024).decode(FORMAT) #recv player number
-        print(f"Waiting to all players to connect\nYou are player {player_number}")
-        initial_board = client_socket.recv(1024).decode(FORMAT)
-        print(initial_board)
-        board=parse_game_board(initial_board)
-        update="board received"
-        client_socket.send(update.encode(FORMAT))
-        active_game = True
-        print("Starting game")
-        while active_game:
-            message = client_socket.recv(1024).decode(FORMAT)
-            print(message)
-            if (message == 'A player has left.'):
-                exit_game()
-                break
-            message_check=parse_game_board(message)
-            if (isinstance(message_check,list)):
-                    if isinstance(message_check[0],list):
-                        board=message_check
-            if (message == f'player {player_number} turn'):
-                while True:  # Keep asking for input until valid input is provided
-                    move = input("Enter your move in the format (row,col):\nPress e to exit game\n")
-                    if (move == 'e'):
-                        exit_game()
-                        break
-                    move = move.strip('()')
-                    # Check if input can be split into exactly two integers
-                    try:
-                        row, col = map(int, move.split(','))
-
-                        # Check if the row and col are within the valid range (0 to 2)
-                        if 0 <= row <= (len(board)-1) and 0 <= col <= (len(board)-1):
-                            if (board[row][col]==""):
-                                client_socket.send(move.encode(FORMAT))
-                                break  # Valid input, exit the loop
-                            else:
-                                print("Invalid move! The spot is already taken.")
-                        else:
-                            print("Invalid move! Row and column must be between 0 and 2.")
-                    except ValueError:
-                        print("Invalid input format! Please enter the move as (row,col) with integers.")
-
-    elif Choose_Game == 2:
-        # Creating a new game
-        game_size=input("Enter number of players for the game\n")
-        client_socket.send(game_size.encode(FORMAT))
-        print("Waiting for other players to join...")
-        game_size = int(game_size)
-        wait_mode=True
-        while wait_mode:
-            message = client_socket.recv(1024).decode(FORMAT)
-            time.sleep(2.5) #sleep to avoid busy wait
-            print(f"number of connected players: {message}/{game_size}")
-            message=int(message)
-            if(message>(game_size-1)):
-                wait_mode=False
-                print("Waiting to all players to connect\nYou are player 1")
-        initial_board = client_socket.recv(1024).decode(FORMAT)
-        print(initial_board)
-        board=parse_game_board(initial_board)
-        update="board received"
-        client_socket.send(update.encode(FORMAT))
-        active_game = True
-        print("Starting game")
-        while active_game:
-            message = client_socket.recv(1024).decode(FORMAT)
-            print(message)
-            if (message == 'A player has left.'):
-                exit_game()
-                break
-            message_check=parse_game_board(message)
-            if (isinstance(message_check,list)):
-                    if isinstance(message_check[0],list):
-                        board=message_check
-            if(message == "player 1 turn"):
-                while True:  # Keep asking for input until valid input is provided
-                    move = input("Enter your move in the format (row,col):\nPress e to exit game\n")
-                    if (move == 'e'):
-                        exit_game()
-                        break
-                    move = move.strip('()')
-                    # Check if input can be split into exactly two integers
-                    try:
-                        row, col = map(int, move.split(','))
-
-                        # Check if the row and col are within the valid range (0 to 2)
-                        if 0 <= row <= (len(board)-1) and 0 <= col <= (len(board)-1):
-                            if (board[row][col]==""):
-                                client_socket.send(move.encode(FORMAT))
-                                break  # Valid input, exit the loop
-                            else:
-                                print("Invalid move! The spot is already taken.")
-                        else:
-                            print("Invalid move! Row and column must be between 0 and 2.")
-                    except ValueError:
-                        print("Invalid input format! Please enter the move as (row,col) with integers.")
-
-    client_socket.close()
-    print("\n[CLOSING CONNECTION] Client closed socket!")
+        print(f"Waiting to all players to connect\nYou are player {client.player_id}")
+        await play_game(client)
+        print("\n[CLOSING CONNECTION] Client closed socket!")
+    except ConnectionError as e:
+        print(e)
+    finally:
+        client.close()
 
 if __name__ == "__main__":
-    client_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-
     print("[CLIENT] Started running")
-    start_client()
+    asyncio.run(start_client())
     print("\nGoodbye client :)")
@@ -0,0 +1,414 @@
+"""
+This module implements the search engine behind the server-side bot players.
+It works on the flat board cells of Game.Board for any number of players,
+board size and win length, and reads the winning lines from the shared
+index of Game.win_lines.
+
+The search is a minimax with alpha-beta pruning. With more than two players
+it is "paranoid": the bot assumes every other player plays against it, which
+keeps the game zero-sum and lets alpha-beta prune. Moves are ordered by the
+transposition table's best move first, then by a cheap static score, and on
+crowded boards only cells next to a piece are searched. Only the MAX_MOVES
+best ordered moves of a position are searched. Below the root only the root
+moves and the cells around the moves played since are ordered, so the cost
+of a node does not grow with the size of the board. Positions are keyed
+by Zobrist hashes into a fixed-size transposition table that keeps the
+deeper result of two colliding positions and evicts entries left by earlier
+searches first. Iterative deepening searches one ply deeper at a time until
+the per-move time budget runs out, and plays the best move of the deepest
+search that finished. The budget counts from the moment the search is asked
+for, setup included, and the clock is read before every node's ordering.
+
+Searches run in a process pool (see bot_pool), so a long search never holds
+the GIL of a server process and never stalls the other games.
+"""
+
+# Imports
+import concurrent.futures
+import multiprocessing
+import os
+import random
+import threading
+import time
+
+from Game import win_lines
+
+MOVE_BUDGET = 0.5  # Seconds a bot may think about one move
+TT_SIZE = 1 << 18  # Slots of the transposition table of each worker process
+MAX_MOVES = 32  # Most moves searched in any one position, the best ordered ones
+WIN = 1 << 20  # Score of a won position; wins found sooner score higher
+LINE_WEIGHT = 10  # A line holding one more piece of a single player scores this many times more
+EXACT, LOWER, UPPER = 0, 1, 2  # Kinds of transposition table scores
+
+"""
+Raised inside the search when the time budget is used up.
+"""
+class SearchTimeout(Exception):
+    pass
+
+"""
+Returns, for every cell of a board of the given size, the cells around it.
+"""
+def neighbours(size):
+    return [
+        [r * size + c for r in range(max(0, row - 1), min(size, row + 2))
+         for c in range(max(0, col - 1), min(size, col + 2)) if (r, c) != (row, col)]
+        for row in range(size) for col in range(size)
+    ]
+
+"""
+Engine class searches for the best move of a bot.
+One engine lives in every worker process and keeps its transposition table
+and Zobrist keys between searches, so later moves of a game reuse the work
+done for the earlier ones.
+"""
+class Engine:
+    def __init__(self, tt_size=TT_SIZE):
+        self.table = [None] * tt_size  # Slot -> (key, depth, score, kind, move, generation)
+        self.mask = tt_size - 1
+        self.generation = 0  # Number of searches so far, to tell stale entries apart
+        self.keys = {}  # (size, win_length, player_id) -> random 64-bit key of every cell
+        self.turn_keys = {}  # (size, win_length, player_id) -> key of that player being the one to move
+        self.neighbours = {}  # size -> neighbours(size)
+        self.random = random.Random(0)  # Keys only need to be fixed within a process
+        self.nodes = 0
+        self.deadline = 0.0
+
+    def neighbours_for(self, size):
+        cells = self.neighbours.get(size)
+        if cells is None:
+            cells = self.neighbours[size] = neighbours(size)
+        return cells
+
+    def keys_for(self, size, win_length, player_id):
+        shape = (size, win_length, player_id)
+        keys = self.keys.get(shape)
+        if keys is None:
+            keys = self.keys[shape] = [self.random.getrandbits(64) for _ in range(size * size)]
+            self.turn_keys[shape] = self.random.getrandbits(64)
+        return keys
+
+    """
+    Returns the best move for player_id as (cell index, depth searched, score).
+    cells is the flat board, win_length the pieces in a row that win,
+    num_players the number of players moving in turn, and budget the number
+    of seconds the search may take.
+    """
+    def best_move(self, cells, size, win_length, player_id, num_players, budget=MOVE_BUDGET):
+        self.deadline = time.perf_counter() + budget
+        self.generation += 1
+        self.nodes = 0
+        cells = list(cells)
+        lines = win_lines(size, win_length)
+        keys = {player: self.keys_for(size, win_length, player) for player in range(1, num_players + 1)}
+        key = 0
+        for cell, player in enumerate(cells):
+            if player:
+                key ^= keys[player][cell]
+        search = Search(self, cells, lines, self.neighbours_for(size), keys, player_id, num_players)
+
+        moves = search.ordered_moves(player_id)
+        search.candidates = list(moves)
+        best, best_depth, best_score = moves[0], 0, 0
+        empty = cells.count(0)
+        for depth in range(1, empty + 1):
+            try:
+                score, move = search.root(key, depth, moves)
+            except SearchTimeout:
+                break
+            best, best_depth, best_score = move, depth, score
+            moves.remove(move)
+            moves.insert(0, move)  # The next iteration starts with the best move so far
+            if abs(score) >= WIN - size * size:
+                break  # A forced result was found, deeper searches cannot change it
+        return best, best_depth, best_score
+
+"""
+Search class runs one best_move search on a private copy of the board.
+Scores are always from the searching bot's point of view.
+"""
+class Search:
+    __slots__ = ("engine", "cells", "lines", "neighbours", "keys", "me", "num_players", "shape", "weights", "score",
+                 "candidates", "path", "empty")
+
+    def __init__(self, engine, cells, lines, neighbours, keys, me, num_players):
+        self.engine = engine
+        self.cells = cells
+        self.lines = lines
+        self.neighbours = neighbours
+        self.keys = keys
+        self.me = me
+        self.num_players = num_players
+        self.shape = (lines.size, lines.length)
+        self.weights = [0] + [LINE_WEIGHT ** count for count in range(lines.length)]  # By pieces in the line
+        self.score = sum(self.line_score(line) for line in lines.lines)  # Static score, kept up to date by play
+        self.candidates = None  # Root moves, the cells ordered below the root besides those around the path
+        self.path = []  # Moves played from the root to the current position
+        self.empty = cells.count(0)  # Empty cells, kept up to date by play
+
+    """
+    Raises SearchTimeout once the time budget is used up.
+    """
+    def check_clock(self):
+        if time.perf_counter() > self.engine.deadline:
+            raise SearchTimeout()
+
+    """
+    Searches every root move to the given depth and returns (score, move).
+    """
+    def root(self, key, depth, moves):
+        alpha, beta = -WIN - 1, WIN + 1
+        best_score, best = -WIN - 1, moves[0]
+        for move in moves:
+            self.check_clock()
+            score = self.play(key, move, self.me, depth, alpha, beta, 1)
+            if score > best_score:
+                best_score, best = score, move
+            alpha = max(alpha, score)
+        return best_score, best
+
+    """
+    Plays move for player, searches the position after it and undoes it.
+    Returns the score of the position after the move. The static score only
+    changes in the lines through the move, so it is updated from those, and
+    the count of empty cells goes down by one.
+    """
+    def play(self, key, move, player, depth, alpha, beta, ply):
+        self.engine.nodes += 1
+        cells = self.cells
+        through = self.lines.through[move]
+        before = sum(self.line_score(line) for line in through)
+        cells[move] = player
+        self.path.append(move)
+        self.empty -= 1
+        try:
+            if self.wins(move, player):
+                return WIN - ply if player == self.me else -WIN + ply
+            change = sum(self.line_score(line) for line in through) - before
+            self.score += change
+            try:
+                if depth <= 1 or not self.empty:
+                    return self.score
+                return self.search(key ^ self.keys[player][move], player % self.num_players + 1,
+                                   depth - 1, alpha, beta, ply + 1)
+            finally:
+                self.score -= change
+        finally:
+            cells[move] = 0
+            self.path.pop()
+            self.empty += 1
+
+    """
+    Alpha-beta search of the position with player to move.
+    The bot maximizes the score and every other player minimizes it.
+    """
+    def search(self, key, player, depth, alpha, beta, ply):
+        self.check_clock()
+        engine = self.engine
+        # The same cells score differently with another player to move or another bot searching
+        tt_key = key ^ engine.turn_keys[self.shape + (player,)] ^ (engine.turn_keys[self.shape + (self.me,)] << 1)
+        slot = tt_key & engine.mask
+        entry = engine.table[slot]
+        tt_move = None
+        if entry is not None and entry[0] == tt_key:
+            tt_move = entry[4]
+            if entry[1] >= depth:
+                score = from_table(entry[2], ply)
+                if entry[3] == EXACT:
+                    return score
+                if entry[3] == LOWER:
+                    alpha = max(alpha, score)
+                else:
+                    beta = min(beta, score)
+                if alpha >= beta:
+                    return score
+
+        maximizing = player == self.me
+        original_alpha, original_beta = alpha, beta
+        best_score = -WIN - 1 if maximizing else WIN + 1
+        best = None
+        for move in self.ordered_moves(player, tt_move):
+            score = self.play(key, move, player, depth, alpha, beta, ply)
+            if maximizing:
+                if score > best_score:
+                    best_score, best = score, move
+                alpha = max(alpha, score)
+            else:
+                if score < best_score:
+                    best_score, best = score, move
+                beta = min(beta, score)
+            if alpha >= beta:
+                break
+
+        if best_score <= original_alpha:
+            kind = UPPER
+        elif best_score >= original_beta:
+            kind = LOWER
+        else:
+            kind = EXACT
+        self.store(slot, tt_key, depth, to_table(best_score, ply), kind, best)
+        return best_score
+
+    """
+    Stores a result in the transposition table. A slot holding a deeper
+    result of the current search is kept; anything else is replaced.
+    """
+    def store(self, slot, key, depth, score, kind, move):
+        engine = self.engine
+        entry = engine.table[slot]
+        if entry is None or entry[5] != engine.generation or entry[1] <= depth or entry[0] == key:
+            engine.table[slot] = (key, depth, score, kind, move, engine.generation)
+
+    """
+    Returns True if player has a winning line through the cell just played.
+    """
+    def wins(self, move, player):
+        cells = self.cells
+        for line in self.lines.through[move]:
+            if all(cells[cell] == player for cell in line):
+                return True
+        return False
+
+    """
+    Returns the moves worth searching for player, best first: the
+    transposition table's move, then wins, then blocks of a win of the next
+    player, then cells by their static score. Once the board has pieces on
+    it, only cells next to a piece are considered, and below the root only
+    the root moves and the cells next to the moves played since. At most
+    MAX_MOVES moves are returned.
+    """
+    def ordered_moves(self, player, tt_move=None):
+        cells = self.cells
+        through = self.lines.through
+        completes = self.lines.length - 1  # Pieces a line needs besides the empty cell to be won there
+        if self.candidates is not None:
+            around = [n for move in self.path for n in self.neighbours[move]]
+            empty = [cell for cell in dict.fromkeys(self.candidates + around) if cells[cell] == 0]
+        else:
+            empty = [cell for cell, owner in enumerate(cells) if owner == 0]
+            if len(empty) < len(cells):
+                near = [cell for cell in empty if any(cells[n] for n in self.neighbours[cell])]
+                empty = near or empty
+        following = player % self.num_players + 1
+        scored = []
+        for cell in empty:
+            score = 0
+            for line in through[cell]:
+                owner, count = line_owner(cells, line)
+                if owner < 0:
+                    continue
+                if count == completes:
+                    score += 1000000 if owner == player else 100000 if owner == following else 10000
+                elif owner in (0, player):
+                    score += 1 + count
+            scored.append((-score, cell))
+        scored.sort()
+        moves = [cell for _, cell in scored]
+        if tt_move is not None and tt_move in moves:
+            moves.remove(tt_move)
+            moves.insert(0, tt_move)
+        return moves[:MAX_MOVES]
+
+    """
+    Returns the static score of one line without a winner: a line that only
+    one player has pieces in counts for that player, and the bot's lines are
+    weighed against those of all its opponents together.
+    """
+    def line_score(self, line):
+        owner, count = line_owner(self.cells, line)
+        if owner <= 0:
+            return 0
+        return self.weights[count] if owner == self.me else -self.weights[count]
+
+"""
+Returns (owner, pieces) of a line: the only player with pieces in it and
+how many it has, (0, 0) for an empty line, or (-1, 0) if several players
+have pieces in it.
+"""
+def line_owner(cells, line):
+    owner = count = 0
+    for cell in line:
+        value = cells[cell]
+        if value:
+            if owner and value != owner:
+                return -1, 0
+            owner = value
+            count += 1
+    return owner, count
+
+"""
+Converts a win score from "plies from the root" to "plies from this node"
+before it goes into the transposition table, and back when it is read, so a
+stored win stays correct when the position is reached at another depth.
+"""
+def to_table(score, ply):
+    if score >= WIN - 4096:
+        return score + ply
+    if score <= -WIN + 4096:
+        return score - ply
+    return score
+
+def from_table(score, ply):
+    if score >= WIN - 4096:
+        return score - ply
+    if score <= -WIN + 4096:
+        return score + ply
+    return score
+
+# Engine of this process, created by the first search
+engine = None
+
+"""
+Process pool entry point: returns the best (row, col) for player_id.
+"""
+def search_move(cells, size, win_length, player_id, num_players, budget=MOVE_BUDGET):
+    global engine
+    if engine is None:
+        engine = Engine()
+    move, _, _ = engine.best_move(cells, size, win_length, player_id, num_players, budget)
+    return divmod(move, size)
+
+"""
+Starts the search for the move of a bot in the process pool and returns
+its future. Should the pool not take the search, the future holds the error
+instead, so the game still gets a move from GameState.searched_move.
+"""
+def submit_search(cells, size, win_length, player_id, num_players, budget=MOVE_BUDGET):
+    try:
+        return bot_pool().submit(search_move, cells, size, win_length, player_id, num_players, budget)
+    except Exception as e:
+        future = concurrent.futures.Future()
+        future.set_exception(e)
+        return future
+
+# Process pool shared by every game of this process, started by the first bot move
+pool = None
+pool_lock = threading.Lock()
+
+"""
+Returns the process pool that runs the bots' searches.
+Workers are spawned rather than forked, since the servers run many threads.
+"""
+def bot_pool():
+    global pool
+    with pool_lock:
+        if pool is None:
+            pool = concurrent.futures.ProcessPoolExecutor(os.cpu_count() or 1,
+                                                          mp_context=multiprocessing.get_context("spawn"))
+        return pool
+
+"""
+Stops the bots' process pool, if it was started: queued searches are
+cancelled and the workers terminated, so a server leaving with os._exit
+does not orphan them. Called from signal handlers, so it does not take
+pool_lock, which the interrupted thread may hold.
+"""
+def shutdown_pool():
+    global pool
+    if pool is None:
+        return
+    processes = list((pool._processes or {}).values())  # Gone from the executor once it is shut down
+    pool.shutdown(wait=False, cancel_futures=True)
+    for process in processes:
+        process.terminate()
+    pool = None
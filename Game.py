@@ -0,0 +1,474 @@
+"""
+This module holds the game state and rules of the Tic Tac Toe game.
+It is shared by the threaded server (Server.py), the asyncio server
+(AsyncServer.py) and the offline simulations (Simulation.py), and does no
+networking of its own. The rules themselves are Board.place, Board.winner
+and turn_after. GameState also builds the encoded frames the servers send,
+so both servers only differ in how they write them.
+"""
+
+# Imports
+import secrets
+import threading
+from array import array
+
+from Log import get_logger
+from Protocol import encode_message
+
+# Directions of a winning line: row, column and both diagonals
+DIRECTIONS = ((0, 1), (1, 0), (1, 1), (1, -1))
+WIN_LENGTH = 3  # Pieces in a row that win a game, unless the game is created with another length
+
+# Reasons a move is rejected, sent back to the player in an invalid_move message
+NOT_YOUR_TURN = "It is not your turn"
+MALFORMED_MOVE = "A move needs an integer row and col"
+OUT_OF_BOUNDS = "The move is outside the board"
+CELL_TAKEN = "The cell is already taken"
+MOVE_ERRORS = (NOT_YOUR_TURN, MALFORMED_MOVE, OUT_OF_BOUNDS, CELL_TAKEN)
+
+log = get_logger("game")
+
+"""
+WinLines class is the index of every winning line of one board size and
+win length: each run of `length` cells in a row, column or diagonal, as a
+tuple of flat cell indexes, for each cell the lines passing through it, and
+for each cell the lines starting at it.
+Indexes are built once per (size, length) by win_lines and shared read-only
+by every game and bot search of that shape.
+"""
+class WinLines:
+    __slots__ = ("size", "length", "lines", "through", "starts")
+
+    def __init__(self, size, length):
+        self.size = size
+        self.length = length
+        lines = []
+        for row in range(size):
+            for col in range(size):
+                for d_row, d_col in DIRECTIONS:
+                    end_row, end_col = row + (length - 1) * d_row, col + (length - 1) * d_col
+                    if 0 <= end_row < size and 0 <= end_col < size:
+                        lines.append(tuple((row + step * d_row) * size + col + step * d_col for step in range(length)))
+        through = [[] for _ in range(size * size)]
+        starts = [[] for _ in range(size * size)]
+        for line in lines:
+            starts[line[0]].append(line[1:])
+            for cell in line:
+                through[cell].append(line)
+        self.lines = tuple(lines)
+        self.through = tuple(tuple(cell_lines) for cell_lines in through)
+        self.starts = tuple(tuple(cell_lines) for cell_lines in starts)  # Without the first cell itself
+
+"""
+Returns the win length of a game for game_size players that was not given
+one: WIN_LENGTH, or the whole side of a board smaller than that.
+"""
+def default_win_length(game_size):
+    return min(WIN_LENGTH, game_size + 1)
+
+"""
+Returns the player to move once `moves` moves have been played.
+Players move in turn starting with player 1, so the turn follows from the
+move count alone.
+"""
+def turn_after(moves, game_size):
+    return moves % game_size + 1
+
+# Built indexes by (size, length), see win_lines
+line_indexes = {}
+line_indexes_lock = threading.Lock()
+
+"""
+Returns the shared WinLines of a board size and win length, building it on
+first use.
+"""
+def win_lines(size, length=WIN_LENGTH):
+    index = line_indexes.get((size, length))
+    if index is None:
+        with line_indexes_lock:
+            index = line_indexes.get((size, length))
+            if index is None:
+                index = line_indexes[(size, length)] = WinLines(size, length)
+    return index
+
+"""
+Board class stores a square board as one flat array of player ids,
+with 0 for an empty cell. Cells are bytes as long as every player id fits
+in one, so a board costs one byte per cell; symbols are only looked up
+when the board is rendered for the players.
+"""
+class Board:
+    __slots__ = ("size", "win_length", "cells", "runs", "filled")
+
+    def __init__(self, size, max_player_id=255, win_length=WIN_LENGTH):
+        self.size = size
+        self.win_length = win_length
+        if max_player_id < 256:
+            self.cells = bytearray(size * size)
+        else:
+            self.cells = array('H', bytes(2 * size * size))
+        # runs[d * size * size + cell] is the length of the run of equal player ids along
+        # direction d that the cell belongs to. It is only kept exact on the two end cells
+        # of each run, which are the only cells place ever reads it from. A run is never
+        # longer than the board side, so one byte per counter is enough on boards below 256.
+        if size < 256:
+            self.runs = bytearray(len(DIRECTIONS) * size * size)
+        else:
+            self.runs = array('H', bytes(2 * len(DIRECTIONS) * size * size))
+        self.filled = 0  # Number of non-empty cells, used to detect a tie
+
+    """
+    Returns the player id at (row, col), 0 if the cell is empty.
+    """
+    def get(self, row, col):
+        return self.cells[row * self.size + col]
+
+    """
+    Returns True if every cell of the board is taken.
+    """
+    def is_full(self):
+        return self.filled == self.size * self.size
+
+    """
+    Places player_id at the empty cell (row, col).
+    Merges the new cell with the runs of the same player on either side of it
+    in each direction and updates the run counters on the new run's end cells,
+    so each move costs O(1) regardless of the board size.
+    Returns True if the move completes win_length in a row.
+    """
+    def place(self, row, col, player_id):
+        size = self.size
+        cells = self.cells
+        runs = self.runs
+        cells[row * size + col] = player_id
+        self.filled += 1
+        won = False
+        for direction, (d_row, d_col) in enumerate(DIRECTIONS):
+            base = direction * size * size  # Start of this direction's counters
+            before = after = 0
+            r, c = row - d_row, col - d_col
+            if 0 <= r < size and 0 <= c < size and cells[r * size + c] == player_id:
+                before = runs[base + r * size + c]  # (r, c) is the end cell of its run
+            r, c = row + d_row, col + d_col
+            if 0 <= r < size and 0 <= c < size and cells[r * size + c] == player_id:
+                after = runs[base + r * size + c]
+            length = before + 1 + after
+            runs[base + row * size + col] = length
+            runs[base + (row - before * d_row) * size + col - before * d_col] = length
+            runs[base + (row + after * d_row) * size + col + after * d_col] = length
+            if length >= self.win_length:
+                won = True
+        return won
+
+    """
+    Places every non-empty cell of a flat sequence of player ids on this
+    empty board, which rebuilds the run counters along the way.
+    """
+    def load(self, cells):
+        size = self.size
+        for index, player_id in enumerate(cells):
+            if player_id:
+                self.place(index // size, index % size, player_id)
+
+    """
+    Scans every winning line of the board for win_length in a row.
+    Returns the id of the player that has one, or 0 if nobody does.
+    """
+    def winner(self):
+        cells = self.cells
+        starts = win_lines(self.size, self.win_length).starts
+        for first, player_id in enumerate(cells):
+            if player_id == 0:
+                continue
+            for rest in starts[first]:
+                for cell in rest:
+                    if cells[cell] != player_id:
+                        break
+                else:
+                    return player_id
+        return 0
+
+    """
+    Returns the board as rows of symbols, where symbols[player_id] is the
+    symbol drawn for that player and symbols[0] the empty cell.
+    """
+    def render(self, symbols):
+        size = self.size
+        cells = self.cells
+        return [[symbols[cells[row * size + col]] for col in range(size)] for row in range(size)]
+
+"""
+GameState class holds an individual game instance.
+Keeps the board, the seated players and their symbols, and implements the
+win and tie detection. Subclasses add the networking for their server mode.
+"""
+class GameState:
+    __slots__ = ("game_id", "creator_conn", "creator_addr", "num_players", "board_size", "board",
+                 "symbols", "players", "winner", "game_over", "turn", "status", "game_size", "seq",
+                 "reserved", "history", "history_base")
+
+    def __init__(self, game_id, creator_conn, creator_addr, creator_reader, creator_deltas=False, creator_binary=False):
+        self.game_id = game_id
+        self.creator_conn = creator_conn
+        self.creator_addr = creator_addr
+        self.num_players = 1
+        self.reserved = 1  # Seats taken or promised to joining players, see GameRegistry
+        self.board_size = (self.num_players + 1)  # Board is (x + 1)^2
+        self.board = Board(3)  # Initialize an empty 3x3 board
+        self.symbols = [" ", self.generate_symbol(0)]  # symbols[player_id], " " for empty cells
+        self.players = {
+            1: {"conn": creator_conn, "addr": creator_addr, "reader": creator_reader,
+                "symbol": self.generate_symbol(0), "deltas": creator_deltas, "binary": creator_binary,
+                "token": secrets.token_hex(16), "bot": False}
+        }
+        self.winner=None
+        self.game_over=False
+        self.turn=1 #first turn is for player 1 the creator of the game
+        self.status = 'waiting'  # New attribute to track the game status
+        self.game_size=0
+        self.seq = 0  # Number of moves played, sent with every board update
+        self.history = array('I')  # Cell index of every move played since history_base, in order
+        self.history_base = 0  # seq before the first move in history
+
+    """
+    Sets the game size and creates the matching empty (game_size + 1)^2 board,
+    won by win_length in a row.
+    """
+    def new_board(self, game_size, win_length=WIN_LENGTH):
+        self.game_size = game_size
+        self.board = Board(game_size + 1, game_size, win_length)
+        self.symbols = [" "] + [self.generate_symbol(player_id) for player_id in range(game_size)]
+
+    """
+    Generates a unique symbol for each player.
+    Uses a combination of X, O, and Greek alphabet symbols to ensure
+    each player has a distinct marker on the board.
+    """
+    def generate_symbol(self, player_id):
+        # List of Greek symbols starting with "X", "O", "Δ", and continuing with Greek alphabet
+        greek_symbols = [
+            "X", "O", "Δ", "Λ", "Φ", "Ψ", "Ω", "Π", "Σ", "Θ",  # Starting with "X", "O", and Greek letters
+            "Α", "Β", "Γ", "Δ", "Ε", "Ζ", "Η", "Θ", "Ι", "Κ",  # Greek alphabet symbols
+            "Λ", "Μ", "Ν", "Ξ", "Ο", "Π", "Ρ", "Σ", "Τ", "Υ",
+            "Φ", "Χ", "Ψ", "Ω"
+        ]
+        # Return the Greek symbol corresponding to the self.num_players
+        return (greek_symbols[player_id % len(greek_symbols)])  # Loop over the Greek symbols list
+
+    """
+    Seats a new player in the game.
+    Updates player count, assigns the new player a unique symbol and
+    returns its player id. Players seated with deltas=True get per-move
+    deltas instead of a full board snapshot after every move, and players
+    seated with binary=True get them as binary payloads. Every seat gets
+    a random token that lets its player resume it after a lost connection
+    or a server restart.
+    """
+    def seat_player(self, conn, addr, reader, deltas=False, binary=False):
+        self.num_players += 1
+        player_id = self.num_players
+        self.players[player_id] = {
+            "conn": conn,
+            "addr": addr,
+            "reader": reader,
+            "symbol": self.generate_symbol(player_id-1),
+            "deltas": deltas,
+            "binary": binary,
+            "token": secrets.token_hex(16),
+            "bot": False,
+        }
+        return player_id
+
+    """
+    Fills count seats with server-side bot players, which have no
+    connection and get their moves from Engine.py.
+    """
+    def seat_bots(self, count):
+        for _ in range(count):
+            player_id = self.seat_player(None, None, None)
+            self.players[player_id]["bot"] = True
+        self.reserved += count
+
+    """
+    Returns True if the player whose turn it is is a bot.
+    """
+    def bot_turn(self):
+        return self.turn is not None and self.players[self.turn]["bot"]
+
+    """
+    Rebuilds an in-progress game from the board cells and seats kept in the
+    journal (see Journal.py). Every seat but the bots' is empty until its
+    player reclaims it with its token. The move count and the turn follow from the board,
+    since players move in turn starting with player 1.
+    """
+    def restore(self, game_size, cells, seats, win_length=WIN_LENGTH):
+        self.new_board(game_size, win_length)
+        self.board.load(cells)
+        self.seq = self.history_base = self.board.filled  # The order of journaled moves is not kept
+        self.turn = turn_after(self.seq, game_size)
+        self.num_players = self.reserved = game_size
+        self.creator_conn = self.creator_addr = None
+        self.players = {
+            player_id: {"conn": None, "addr": None, "reader": None, "symbol": self.symbols[player_id],
+                        "deltas": seat["deltas"], "binary": False, "token": seat["token"],
+                        "bot": seat.get("bot", False)}
+            for player_id, seat in seats.items()
+        }
+        self.status = 'recovering'
+
+    """
+    Returns why a move message from player_id cannot be played, one of
+    MOVE_ERRORS, or None if it is a legal move of the player whose turn it
+    is. Only cheap checks, so floods of bad moves cost little.
+    """
+    def move_error(self, player_id, message):
+        if player_id != self.turn:
+            return NOT_YOUR_TURN
+        row, col = message.get("row"), message.get("col")
+        if type(row) is not int or type(col) is not int:
+            return MALFORMED_MOVE
+        size = self.board.size
+        if not (0 <= row < size and 0 <= col < size):
+            return OUT_OF_BOUNDS
+        if self.board.cells[row * size + col]:
+            return CELL_TAKEN
+        return None
+
+    """
+    Places the player whose turn it is at (row, col) and advances the move
+    sequence number. Only the lines through the new cell are checked.
+    Returns the same values as check_winner.
+    """
+    def play_move(self, row, col):
+        self.seq += 1
+        self.history.append(row * self.board.size + col)
+        if self.board.place(row, col, self.turn):
+            return self.symbols[self.turn]  # Return the winning symbol
+        if self.board.is_full():
+            return "Tie"  # The board is full with no winner
+        return False
+
+    """
+    Plays the move of the player whose turn it is and passes the turn on,
+    or sets it to None once the move ended the game.
+    Returns the same values as check_winner.
+    """
+    def play_turn(self, row, col):
+        result = self.play_move(row, col)
+        self.turn = None if result else turn_after(self.seq, self.game_size)
+        return result
+
+    """
+    Returns the message telling a player its seat and the token to reclaim it.
+    """
+    def seat_message(self, player_id):
+        return {"type": "player_id", "player_id": player_id, "game_id": self.game_id,
+                "token": self.players[player_id]["token"]}
+
+    """
+    Returns the full board snapshot message.
+    """
+    def snapshot_message(self):
+        return {"type": "board", "board": self.board.render(self.symbols), "seq": self.seq, "turn": self.turn}
+
+    """
+    Returns the delta message describing the move just played at (row, col).
+    """
+    def delta_message(self, row, col):
+        return {"type": "delta", "row": row, "col": col, "symbol": self.symbols[self.board.get(row, col)],
+                "seq": self.seq, "turn": self.turn}
+
+    """
+    Returns the delta messages of the moves played after last_seq, in order,
+    for a player resuming after a disconnect. Returns None if those moves are
+    not all known, in which case the player needs a full snapshot instead.
+    """
+    def missed_moves(self, last_seq):
+        if last_seq is None or not self.history_base <= last_seq <= self.seq:
+            return None
+        size = self.board.size
+        messages = []
+        for seq in range(last_seq + 1, self.seq + 1):
+            row, col = divmod(self.history[seq - 1 - self.history_base], size)
+            turn = self.turn if seq == self.seq else turn_after(seq, self.game_size)
+            messages.append({"type": "delta", "row": row, "col": col, "symbol": self.symbols[self.board.get(row, col)],
+                             "seq": seq, "turn": turn})
+        return messages
+
+    """
+    Returns one encoded frame of message per player, keyed by player id.
+    The message is encoded once per encoding and the same bytes are used for
+    everyone using it.
+    """
+    def message_frames(self, message):
+        encoded = {}
+        frames = {}
+        for player_id, player in self.players.items():
+            if player["binary"] not in encoded:
+                encoded[player["binary"]] = encode_message(message, player["binary"])
+            frames[player_id] = encoded[player["binary"]]
+        return frames
+
+    """
+    Returns the frame of the update for the move just played at (row, col)
+    for every player, keyed by player id. Players that asked for deltas get
+    the compact delta, the others a full board snapshot, in the encoding
+    each player asked for. Each message is encoded at most once per encoding.
+    """
+    def update_frames(self, row, col):
+        encoded = {}
+        frames = {}
+        for player_id, player in self.players.items():
+            kind = (player["deltas"], player["binary"])
+            if kind not in encoded:
+                message = self.delta_message(row, col) if player["deltas"] else self.snapshot_message()
+                encoded[kind] = encode_message(message, player["binary"])
+            frames[player_id] = encoded[kind]
+        return frames
+
+    """
+    Returns (frame, replayed) for a player resuming its seat. The frame holds
+    its seat message with the current seq and turn, followed by the deltas of
+    the moves it missed after last_seq, or by a snapshot if it does not use
+    deltas or those moves are not known anymore. replayed is the number of
+    deltas in it.
+    """
+    def resume_frame(self, player_id, last_seq, deltas, binary):
+        missed = self.missed_moves(last_seq) if deltas else None
+        messages = [{**self.seat_message(player_id), "seq": self.seq, "turn": self.turn}]
+        messages += missed if missed is not None else [self.snapshot_message()]
+        return b"".join(encode_message(message, binary) for message in messages), len(missed or ())
+
+    """
+    Returns the move message of a bot from its finished search, a future of
+    (row, col). Should the search have failed, the bot plays the first free
+    cell so the game goes on.
+    """
+    def searched_move(self, future):
+        try:
+            row, col = future.result()
+        except Exception as e:
+            log.warning("Bot of game %d could not search a move: %s", self.game_id, e)
+            row, col = divmod(self.board.cells.index(0), self.board.size)
+        return {"type": "move", "row": row, "col": col}
+
+    """
+    Check if there is a winner in the game by scanning the whole board.
+    The turn loop uses play_move instead; this full scan is kept as the
+    reference implementation.
+    Returns:
+        str: Symbol of the winner if there is one (e.g., 'X' or 'O'),
+             'Tie' if the board is full with no winner,
+             False if the game is still ongoing.
+    """
+    def check_winner(self):
+        player_id = self.board.winner()
+        if player_id:
+            return self.symbols[player_id]  # Return the winning symbol
+
+        # Check for a tie (no empty spaces left)
+        if self.board.is_full():
+            return "Tie"  # The board is full with no winner
+
+        # Game is still ongoing
+        return False
@@ -0,0 +1,193 @@
+"""
+This module keeps an append-only journal of the games running on a server,
+so in-progress games survive a server restart.
+
+The journal is a file of JSON lines:
+    {"op": "snapshot", "games": [game, ...]}      first line, the compacted state
+    {"op": "start", "game": game}                 a game has started
+    {"op": "move", "game_id": id, "row": r, "col": c, "player": n}
+    {"op": "end", "game_id": id}                  a game is over
+where game is {"game_id", "game_size", "win_length", "cells", "wide", "seats"}:
+the board's cells as base64 (two bytes per cell if "wide"), and the seat
+token and delta preference of each player id, and whether the seat is a bot.
+
+Records are queued in memory and written by a background thread in batches,
+one write and at most one fsync per batch, so a move never waits for the
+disk. A crash loses at most the last batch. Every snapshot_every records the
+writer compacts the journal into a single snapshot line.
+"""
+
+# Imports
+import base64
+import json
+import os
+import threading
+from array import array
+
+from Game import WIN_LENGTH
+from Log import get_logger
+from Metrics import metrics
+
+FLUSH_INTERVAL = 0.02  # Seconds the writer gathers records before writing a batch
+SNAPSHOT_EVERY = 10000  # Records written between two compactions
+
+log = get_logger("journal")
+
+"""
+Returns the journal entry describing a game's board and seats.
+"""
+def game_entry(game):
+    cells = game.board.cells
+    wide = isinstance(cells, array)
+    return {
+        "game_id": game.game_id,
+        "game_size": game.game_size,
+        "win_length": game.board.win_length,
+        "cells": base64.b64encode(cells.tobytes() if wide else bytes(cells)).decode("ascii"),
+        "wide": wide,
+        "seats": {player_id: {"token": player["token"], "deltas": player["deltas"], "bot": player["bot"]}
+                  for player_id, player in list(game.players.items())},
+    }
+
+"""
+Journal class appends game records to a journal file from a background thread.
+snapshot_source() must return the games to write into a snapshot, i.e.
+every game that is running or waiting to be resumed.
+"""
+class Journal:
+    def __init__(self, path, snapshot_source, fsync=True, flush_interval=FLUSH_INTERVAL,
+                 snapshot_every=SNAPSHOT_EVERY):
+        self.path = path
+        self.snapshot_source = snapshot_source
+        self.fsync = fsync
+        self.flush_interval = flush_interval
+        self.snapshot_every = snapshot_every
+        self.pending = []  # Records not written yet
+        self.lock = threading.Lock()  # Guards pending
+        self.written = 0  # Records written since the last compaction
+        self.closing = threading.Event()
+        self.file = None
+        self.compact()  # Start from a single snapshot line
+        self.thread = threading.Thread(target=self.run, name="journal-writer", daemon=True)
+        self.thread.start()
+
+    """
+    Queues a record for the writer thread.
+    """
+    def append(self, record):
+        with self.lock:
+            self.pending.append(record)
+
+    def game_started(self, game):
+        self.append({"op": "start", "game": game_entry(game)})
+
+    def move_played(self, game, row, col, player_id):
+        self.append({"op": "move", "game_id": game.game_id, "row": row, "col": col, "player": player_id})
+
+    def game_finished(self, game):
+        self.append({"op": "end", "game_id": game.game_id})
+
+    """
+    Writer thread: every flush_interval writes the records queued meanwhile
+    as one batch, and compacts the journal every snapshot_every records.
+    """
+    def run(self):
+        while True:
+            closing = self.closing.wait(self.flush_interval)
+            with self.lock:
+                batch, self.pending = self.pending, []
+            if batch:
+                self.write_batch(batch)
+                if self.written >= self.snapshot_every:
+                    self.compact()
+            if closing:
+                return
+
+    """
+    Appends a batch of records with one write and one fsync.
+    """
+    def write_batch(self, batch):
+        data = "".join(json.dumps(record, separators=(',', ':')) + "\n" for record in batch)
+        self.file.write(data)
+        self.file.flush()
+        if self.fsync:
+            os.fsync(self.file.fileno())
+        self.written += len(batch)
+        metrics.inc("journal_records", len(batch))
+        metrics.inc("journal_batches")
+
+    """
+    Replaces the journal with one snapshot line of the current games.
+    The snapshot goes to a temporary file first and is renamed over the
+    journal, so a crash during compaction leaves the old journal intact.
+    Records queued meanwhile go to the new journal; replay skips moves
+    that the snapshot already holds.
+    """
+    def compact(self):
+        games = [game_entry(game) for game in self.snapshot_source()]
+        temporary = self.path + ".tmp"
+        with open(temporary, "w") as f:
+            f.write(json.dumps({"op": "snapshot", "games": games}, separators=(',', ':')) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temporary, self.path)
+        if self.file is not None:
+            self.file.close()
+        self.file = open(self.path, "a")
+        self.written = 0
+        metrics.inc("journal_snapshots")
+        log.debug("Journal %s compacted to %d games", self.path, len(games))
+
+    """
+    Writes the queued records and stops the writer thread.
+    """
+    def close(self):
+        self.closing.set()
+        self.thread.join()
+        self.file.close()
+
+"""
+Reads a journal and returns the games that were in progress, as a list of
+{"game_id", "game_size", "win_length", "cells", "seats"} with cells as a flat bytearray or
+array('H') of player ids and seats keyed by int player id.
+A torn last line, left by a crash in the middle of a write, is ignored.
+"""
+def replay(path):
+    games = {}
+    if not os.path.exists(path):
+        return []
+    with open(path) as f:
+        for number, line in enumerate(f, 1):
+            try:
+                record = json.loads(line)
+            except ValueError:
+                log.warning("Ignoring the unreadable end of journal %s from line %d", path, number)
+                break
+            if record["op"] == "snapshot":
+                games = {entry["game_id"]: load_entry(entry) for entry in record["games"]}
+            elif record["op"] == "start":
+                entry = load_entry(record["game"])
+                games[entry["game_id"]] = entry
+            elif record["op"] == "move":
+                game = games.get(record["game_id"])
+                if game is not None:
+                    index = record["row"] * (game["game_size"] + 1) + record["col"]
+                    if not game["cells"][index]:  # Moves already in the snapshot are skipped
+                        game["cells"][index] = record["player"]
+            elif record["op"] == "end":
+                games.pop(record["game_id"], None)
+    return list(games.values())
+
+"""
+Decodes a journal game entry.
+"""
+def load_entry(entry):
+    data = base64.b64decode(entry["cells"])
+    if entry["wide"]:
+        cells = array('H')
+        cells.frombytes(data)
+    else:
+        cells = bytearray(data)
+    seats = {int(player_id): seat for player_id, seat in entry["seats"].items()}
+    return {"game_id": entry["game_id"], "game_size": entry["game_size"], "win_length": entry.get("win_length", WIN_LENGTH),
+            "cells": cells, "seats": seats}
@@ -0,0 +1,45 @@
+"""
+This module sets up the leveled, non-blocking logging used by the servers.
+Log calls only put the record on a queue; a single background listener
+thread formats and writes the records, so game threads and the event loop
+never block on stdout or contend for it.
+"""
+
+# Imports
+import atexit
+import logging
+import logging.handlers
+import queue
+import sys
+
+ROOT_LOGGER = "tictactoe"  # Every logger of the project lives under this name
+FORMAT = "%(asctime)s %(levelname)-7s %(name)s: %(message)s"
+
+listener = None  # The QueueListener writing the records, once setup_logging has run
+
+"""
+Returns the logger for one part of the project, e.g. get_logger("server").
+"""
+def get_logger(name):
+    return logging.getLogger(f"{ROOT_LOGGER}.{name}")
+
+"""
+Sends every project log record at or above level through a queue to a
+background thread that writes it to stream (stdout by default).
+Can be called again to change the level or the stream.
+"""
+def setup_logging(level="INFO", stream=None):
+    global listener
+    if listener is not None:
+        listener.stop()
+    else:
+        atexit.register(lambda: listener.stop())  # Flush queued records on exit
+    records = queue.SimpleQueue()
+    handler = logging.StreamHandler(stream or sys.stdout)
+    handler.setFormatter(logging.Formatter(FORMAT))
+    listener = logging.handlers.QueueListener(records, handler)
+    root = logging.getLogger(ROOT_LOGGER)
+    root.handlers[:] = [logging.handlers.QueueHandler(records)]
+    root.setLevel(level.upper() if isinstance(level, str) else level)
+    root.propagate = False
+    listener.start()
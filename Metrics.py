@@ -0,0 +1,311 @@
+"""
+This module collects runtime metrics for both servers.
+Counters count events, and histograms record latencies into fixed
+logarithmic buckets, so a sample costs one bisect and memory stays constant
+however long the server runs. A small HTTP endpoint serves the metrics and
+can run a sampling profiler on demand.
+
+Endpoints of start_metrics_server:
+    /metrics                   Prometheus style text
+    /metrics.json              the same values as JSON
+    /profile?seconds=s&interval=i
+                               samples every thread's stack for s seconds and
+                               returns collapsed stacks ("frame;frame count"),
+                               ready for flamegraph tools
+"""
+
+# Imports
+import bisect
+import collections
+import http.server
+import json
+import os
+import sys
+import threading
+import time
+import urllib.parse
+
+from Log import get_logger
+
+PREFIX = "tictactoe"  # Prefix of every exported metric name
+BUCKETS = tuple(10 ** (exponent / 4) for exponent in range(-24, 5))  # Bucket bounds from 1 us to 10 s, in seconds
+
+log = get_logger("metrics")
+
+"""
+Counter class counts events. Safe to increment from any thread.
+"""
+class Counter:
+    __slots__ = ("value", "lock")
+
+    def __init__(self):
+        self.value = 0
+        self.lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self.lock:
+            self.value += amount
+
+"""
+Histogram class records durations in seconds into the BUCKETS bounds.
+Percentiles are estimated as the upper bound of the bucket they fall in.
+"""
+class Histogram:
+    __slots__ = ("counts", "count", "sum", "lock")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)  # The last bucket holds samples above the largest bound
+        self.count = 0
+        self.sum = 0.0
+        self.lock = threading.Lock()
+
+    def observe(self, seconds):
+        index = bisect.bisect_left(BUCKETS, seconds)
+        with self.lock:
+            self.counts[index] += 1
+            self.count += 1
+            self.sum += seconds
+
+    """
+    Returns the estimated p-th percentile in seconds, or 0 without samples.
+    """
+    def percentile(self, p):
+        with self.lock:
+            counts, count = list(self.counts), self.count
+        if count == 0:
+            return 0.0
+        rank = count * p / 100
+        seen = 0
+        for index, bucket_count in enumerate(counts):
+            seen += bucket_count
+            if seen >= rank:
+                return BUCKETS[index] if index < len(BUCKETS) else float("inf")
+        return float("inf")
+
+"""
+Timer class is a context manager that records the time spent in its block
+into a histogram.
+"""
+class Timer:
+    __slots__ = ("histogram", "start")
+
+    def __init__(self, histogram):
+        self.histogram = histogram
+        self.start = 0.0
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.histogram.observe(time.perf_counter() - self.start)
+        return False
+
+"""
+Metrics class holds every counter, histogram and gauge by name.
+Instruments are created on first use; gauges are callables that are only
+evaluated when the metrics are read.
+"""
+class Metrics:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters = {}
+        self.histograms = {}
+        self.gauges = {}
+
+    def counter(self, name):
+        counter = self.counters.get(name)
+        if counter is None:
+            with self.lock:
+                counter = self.counters.setdefault(name, Counter())
+        return counter
+
+    def histogram(self, name):
+        histogram = self.histograms.get(name)
+        if histogram is None:
+            with self.lock:
+                histogram = self.histograms.setdefault(name, Histogram())
+        return histogram
+
+    """
+    Registers a gauge whose value is read from function() when exported.
+    """
+    def gauge(self, name, function):
+        with self.lock:
+            self.gauges[name] = function
+
+    def inc(self, name, amount=1):
+        self.counter(name).inc(amount)
+
+    def observe(self, name, seconds):
+        self.histogram(name).observe(seconds)
+
+    """
+    Returns a context manager that times its block into the named histogram.
+    """
+    def timer(self, name):
+        return Timer(self.histogram(name))
+
+    """
+    Returns every metric as a plain dictionary.
+    Histograms are summarized by count, sum and p50/p90/p99 in milliseconds.
+    """
+    def snapshot(self):
+        with self.lock:
+            counters, histograms, gauges = dict(self.counters), dict(self.histograms), dict(self.gauges)
+        result = {"counters": {name: counter.value for name, counter in counters.items()},
+                  "gauges": {}, "histograms": {}}
+        for name, function in gauges.items():
+            try:
+                result["gauges"][name] = function()
+            except Exception as e:
+                log.warning("Gauge %s failed: %s", name, e)
+        for name, histogram in histograms.items():
+            result["histograms"][name] = {
+                "count": histogram.count,
+                "sum_ms": histogram.sum * 1000,
+                "p50_ms": histogram.percentile(50) * 1000,
+                "p90_ms": histogram.percentile(90) * 1000,
+                "p99_ms": histogram.percentile(99) * 1000,
+            }
+        return result
+
+    """
+    Renders every metric in the Prometheus text exposition format.
+    """
+    def render_text(self):
+        with self.lock:
+            counters, histograms, gauges = dict(self.counters), dict(self.histograms), dict(self.gauges)
+        lines = []
+        for name, counter in sorted(counters.items()):
+            lines.append(f"# TYPE {PREFIX}_{name}_total counter")
+            lines.append(f"{PREFIX}_{name}_total {counter.value}")
+        for name, function in sorted(gauges.items()):
+            try:
+                value = function()
+            except Exception as e:
+                log.warning("Gauge %s failed: %s", name, e)
+                continue
+            lines.append(f"# TYPE {PREFIX}_{name} gauge")
+            lines.append(f"{PREFIX}_{name} {value}")
+        for name, histogram in sorted(histograms.items()):
+            with histogram.lock:
+                counts, count, total = list(histogram.counts), histogram.count, histogram.sum
+            lines.append(f"# TYPE {PREFIX}_{name}_seconds histogram")
+            cumulative = 0
+            for bound, bucket_count in zip(BUCKETS, counts):
+                cumulative += bucket_count
+                lines.append(f'{PREFIX}_{name}_seconds_bucket{{le="{bound:.6g}"}} {cumulative}')
+            lines.append(f'{PREFIX}_{name}_seconds_bucket{{le="+Inf"}} {count}')
+            lines.append(f"{PREFIX}_{name}_seconds_sum {total}")
+            lines.append(f"{PREFIX}_{name}_seconds_count {count}")
+        return "\n".join(lines) + "\n"
+
+# Metrics shared by everything running in this process
+metrics = Metrics()
+
+"""
+SamplingProfiler class periodically samples the stacks of every thread in
+the process and counts how often each stack was seen.
+It only reads frames, so the profiled threads are never paused or traced.
+"""
+class SamplingProfiler:
+    def __init__(self, interval=0.005):
+        self.interval = interval  # Seconds between two samples
+        self.stacks = collections.Counter()  # Collapsed stack -> number of samples
+        self.samples = 0
+        self.stopped = threading.Event()
+        self.thread = None
+
+    def start(self):
+        self.stopped.clear()
+        self.thread = threading.Thread(target=self.run, name="sampling-profiler", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stopped.set()
+        if self.thread is not None:
+            self.thread.join()
+
+    def run(self):
+        own_id = threading.get_ident()
+        while not self.stopped.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id != own_id:
+                    self.stacks[collapse_stack(frame)] += 1
+            self.samples += 1
+
+    """
+    Returns the samples as collapsed stack lines, most frequent first.
+    """
+    def collapsed(self):
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+"""
+Returns the stack ending in frame as "file:function;...;file:function",
+outermost frame first.
+"""
+def collapse_stack(frame):
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+"""
+Samples every thread for the given number of seconds and returns the
+collapsed stacks.
+"""
+def profile(seconds, interval=0.005):
+    profiler = SamplingProfiler(interval)
+    profiler.start()
+    time.sleep(seconds)
+    profiler.stop()
+    return profiler.collapsed()
+
+"""
+MetricsHandler class answers the HTTP requests of the metrics endpoint.
+"""
+class MetricsHandler(http.server.BaseHTTPRequestHandler):
+    registry = metrics
+
+    def do_GET(self):
+        url = urllib.parse.urlsplit(self.path)
+        query = urllib.parse.parse_qs(url.query)
+        try:
+            if url.path == "/metrics":
+                self.reply("text/plain; version=0.0.4", self.registry.render_text())
+            elif url.path == "/metrics.json":
+                self.reply("application/json", json.dumps(self.registry.snapshot(), indent=2))
+            elif url.path == "/profile":
+                seconds = min(float(query.get("seconds", ["5"])[0]), 60.0)
+                interval = max(float(query.get("interval", ["0.005"])[0]), 0.001)
+                self.reply("text/plain", profile(seconds, interval))
+            else:
+                self.send_error(404)
+        except ValueError as e:
+            self.send_error(400, str(e))
+
+    def reply(self, content_type, body):
+        data = body.encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        log.debug("%s " + format, self.address_string(), *args)
+
+"""
+Serves the metrics endpoint from a daemon thread.
+Returns the HTTP server, whose server_address holds the bound port.
+"""
+def start_metrics_server(host, port, registry=metrics):
+    handler = type("BoundMetricsHandler", (MetricsHandler,), {"registry": registry})
+    server = http.server.ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    log.info("Metrics endpoint listening on http://%s:%d/metrics", *server.server_address[:2])
+    return server
@@ -0,0 +1,356 @@
+"""
+This module implements the framed message protocol shared by the client and both servers.
+Every message travels as one frame: a 5-byte header holding the payload length
+and the payload kind, followed by the payload. JSON payloads are objects whose
+"type" field names the message. Moves, deltas and board snapshots can also
+travel as compact binary payloads (see below); they decode to the same
+message dictionaries as their JSON form.
+
+Client to server messages:
+    {"type": "create", "game_size": n, "deltas": bool, "binary": bool, "bots": k, "win_length": w}
+                                                         create a game for n players, k of
+                                                         them bots played by the server,
+                                                         won by w in a row (3 by default, or
+                                                         the whole side of a smaller board)
+    {"type": "list"}                                     ask for the games waiting for players
+    {"type": "join", "game_id": id, "deltas": bool, "binary": bool}
+                                                         join a waiting game
+    {"type": "match", "game_size": n, "deltas": bool, "binary": bool}
+                                                         join any waiting game for n players,
+                                                         or create one if none has a free seat
+    {"type": "resume", "game_id": id, "token": t, "last_seq": s, "deltas": bool, "binary": bool}
+                                                         return to your seat after a lost
+                                                         connection or a server restart
+    {"type": "watch", "game_id": id}                     follow a game as a spectator
+    {"type": "move", "row": r, "col": c}                 play a move on your turn
+    {"type": "resync"}                                   ask for a fresh board snapshot
+    {"type": "exit"}                                     leave the game
+
+Server to client messages:
+    {"type": "games", "games": [ids]}                  answer to "list"
+    {"type": "error", "message": text}                 request could not be served
+    {"type": "player_id", "player_id": n, "game_id": id, "token": t}
+                                                       your seat in the game, and the
+                                                       token to resume it with; the
+                                                       answer to "resume" adds "seq"
+                                                       and "turn"
+    {"type": "player_count", "count": n, "game_size": m}
+    {"type": "board", "board": [[symbol, ...], ...], "seq": s, "turn": n}
+    {"type": "delta", "row": r, "col": c, "symbol": symbol, "seq": s, "turn": n}
+    {"type": "player_away", "player": n, "grace": seconds}
+    {"type": "player_back", "player": n}
+    {"type": "game_over", "reason": "won" | "tie" | "left" | "timeout", "player": n}
+    {"type": "invalid_move", "message": text}          your move was rejected, play another
+
+"seq" counts the moves played so far and "turn" is the player to move next,
+or None once the game is over. Players that ask for "deltas" get one board
+snapshot when the game starts and then one delta per move; the others get a
+full snapshot after every move. A client that sees a gap in "seq" sends
+"resync" to get a new snapshot.
+
+Moves out of turn, outside the board, on a taken cell or without integer
+coordinates are answered with "invalid_move" and the game goes on. Each
+connection may send MESSAGE_RATE messages per second, in bursts of up to
+MESSAGE_BURST; the server drops the messages beyond that.
+
+A player whose connection drops keeps its seat for a grace period. Resuming
+with the last "seq" it saw gets it the deltas of the moves it missed, or a
+snapshot if it does not use deltas or the server cannot replay them. A player
+that does not come back in time has left the game.
+
+The server enforces three deadlines, each of which can be turned off. A
+connection that does not send its request in time is closed. A game whose
+players have not all joined in time ends with a "timeout" game_over whose
+"player" is None. A player that does not move in time on its turn ends the
+game with a "timeout" game_over naming that player.
+
+Spectators only receive: a snapshot when they start watching, a delta per
+move, and the game_over message, after which the server closes the
+connection. A spectator that falls behind skips the moves it has no room
+for and gets one snapshot of the latest board once it has caught up.
+
+A player whose seat request has "binary" set gets its board snapshots and
+deltas as binary payloads, and may send its moves as binary payloads too;
+every other message stays JSON. The binary payloads, in network byte order:
+    KIND_MOVE   MOVE (row, col)
+    KIND_DELTA  DELTA (row, col, seq, turn), then the symbol in UTF-8
+    KIND_BOARD  BOARD (side, seq, turn, bytes per cell, table length), then
+                the symbol table, the symbols in UTF-8 separated by NUL, then
+                every cell row by row as an index into the table
+A "turn" of 0 stands for None. A client that does not ask for "binary"
+only ever sees JSON.
+"""
+
+# Imports
+import collections
+import itertools
+import json
+import struct
+import sys
+import time
+from array import array
+
+FORMAT = 'utf-8'  # Define the encoding format of JSON payloads
+HEADER = struct.Struct('!IB')  # Payload length and payload kind, in network byte order
+KIND_JSON = 1  # Payload is a UTF-8 encoded JSON object
+KIND_MOVE = 2  # Payload is a binary move
+KIND_DELTA = 3  # Payload is a binary delta
+KIND_BOARD = 4  # Payload is a binary board snapshot
+MOVE = struct.Struct('!HH')  # row, col
+DELTA = struct.Struct('!HHIH')  # row, col, seq, turn
+BOARD = struct.Struct('!HIHBH')  # side, seq, turn, bytes per cell, length of the symbol table
+MAX_PAYLOAD = 1 << 20  # Frames larger than this are treated as a protocol error
+RECV_SIZE = 4096  # Number of bytes requested from the socket per recv
+OUTBOX_LIMIT = 256 * 1024  # Bytes a connection may have queued before it counts as a slow consumer
+CLOSE_FLUSH_TIMEOUT = 1.0  # Seconds a closing game waits for queued bytes to drain
+MESSAGE_RATE = 20  # Messages per second a connection may send during a game
+MESSAGE_BURST = 40  # Messages a connection may send at once after being quiet
+
+"""
+Raised when the peer sends something that is not a valid frame.
+"""
+class ProtocolError(Exception):
+    pass
+
+"""
+Encodes a message dictionary into a complete frame.
+With binary=True, moves, deltas and board snapshots get a binary payload;
+any other message is encoded as JSON either way.
+"""
+def encode_message(message, binary=False):
+    if binary and message["type"] in BINARY_ENCODERS:
+        kind, encode = BINARY_ENCODERS[message["type"]]
+        payload = encode(message)
+        return HEADER.pack(len(payload), kind) + payload
+    payload = json.dumps(message, separators=(',', ':')).encode(FORMAT)
+    return HEADER.pack(len(payload), KIND_JSON) + payload
+
+def encode_move(message):
+    return MOVE.pack(message["row"], message["col"])
+
+def encode_delta(message):
+    return DELTA.pack(message["row"], message["col"], message["seq"], message["turn"] or 0) + message["symbol"].encode(FORMAT)
+
+"""
+Encodes a board snapshot as a table of the symbols on the board followed by
+one byte per cell, or two on boards with more than 256 different symbols.
+"""
+def encode_board(message):
+    rows = message["board"]
+    symbols = list(dict.fromkeys(itertools.chain.from_iterable(rows)))
+    index = {symbol: position for position, symbol in enumerate(symbols)}
+    indexes = map(index.__getitem__, itertools.chain.from_iterable(rows))
+    if len(symbols) <= 256:
+        width, cells = 1, bytes(indexes)
+    else:
+        cells = array('H', indexes)
+        if sys.byteorder == "little":
+            cells.byteswap()
+        width, cells = 2, cells.tobytes()
+    table = "\0".join(symbols).encode(FORMAT)
+    return BOARD.pack(len(rows), message["seq"], message["turn"] or 0, width, len(table)) + table + cells
+
+def decode_move(payload):
+    row, col = MOVE.unpack(payload)
+    return {"type": "move", "row": row, "col": col}
+
+def decode_delta(payload):
+    row, col, seq, turn = DELTA.unpack_from(payload)
+    return {"type": "delta", "row": row, "col": col, "symbol": payload[DELTA.size:].decode(FORMAT), "seq": seq,
+            "turn": turn or None}
+
+def decode_board(payload):
+    side, seq, turn, width, table_length = BOARD.unpack_from(payload)
+    start = BOARD.size + table_length
+    symbols = payload[BOARD.size:start].decode(FORMAT).split("\0")
+    if width == 1:
+        cells = payload[start:]
+    else:
+        cells = array('H')
+        cells.frombytes(payload[start:])
+        if sys.byteorder == "little":
+            cells.byteswap()
+    if len(cells) != side * side:
+        raise ProtocolError(f"Board of side {side} has {len(cells)} cells")
+    board = [list(map(symbols.__getitem__, cells[row * side:(row + 1) * side])) for row in range(side)]
+    return {"type": "board", "board": board, "seq": seq, "turn": turn or None}
+
+BINARY_ENCODERS = {"move": (KIND_MOVE, encode_move), "delta": (KIND_DELTA, encode_delta),
+                   "board": (KIND_BOARD, encode_board)}  # Message type -> (payload kind, encoder)
+BINARY_DECODERS = {KIND_MOVE: decode_move, KIND_DELTA: decode_delta, KIND_BOARD: decode_board}
+
+"""
+Decodes the payload of a frame back into a message dictionary.
+"""
+def decode_payload(kind, payload):
+    if kind in BINARY_DECODERS:
+        try:
+            return BINARY_DECODERS[kind](payload)
+        except (struct.error, ValueError, IndexError) as e:
+            raise ProtocolError(f"Invalid binary payload of kind {kind}: {e}")
+    if kind != KIND_JSON:
+        raise ProtocolError(f"Unknown payload kind {kind}")
+    try:
+        message = json.loads(payload.decode(FORMAT))
+    except ValueError as e:
+        raise ProtocolError(f"Invalid JSON payload: {e}")
+    if not isinstance(message, dict) or "type" not in message:
+        raise ProtocolError("Payload is not a typed message")
+    return message
+
+"""
+Checks a frame header and returns the payload length and kind.
+"""
+def unpack_header(header):
+    length, kind = HEADER.unpack(header)
+    if length > MAX_PAYLOAD:
+        raise ProtocolError(f"Frame of {length} bytes exceeds the {MAX_PAYLOAD} byte limit")
+    return length, kind
+
+"""
+Sends one message on a blocking socket.
+"""
+def send_message(sock, message, binary=False):
+    sock.sendall(encode_message(message, binary))
+
+"""
+MessageReader class reads frames from a blocking socket.
+Bytes are buffered across recv calls, so messages that TCP splits into
+several segments or coalesces into one segment are still returned one by one.
+"""
+class MessageReader:
+    def __init__(self, sock):
+        self.sock = sock
+        self.buffer = bytearray()
+
+    """
+    Returns the next complete message already in the buffer, or None if
+    the buffer does not hold a complete frame yet.
+    """
+    def next_buffered(self):
+        if len(self.buffer) < HEADER.size:
+            return None
+        length, kind = unpack_header(self.buffer[:HEADER.size])
+        end = HEADER.size + length
+        if len(self.buffer) < end:
+            return None
+        payload = bytes(self.buffer[HEADER.size:end])
+        del self.buffer[:end]
+        return decode_payload(kind, payload)
+
+    """
+    Reads whatever the socket has available into the buffer.
+    Raises ConnectionError if the peer has closed the connection.
+    """
+    def fill(self):
+        data = self.sock.recv(RECV_SIZE)
+        if not data:
+            raise ConnectionError("Connection closed by peer")
+        self.buffer += data
+
+    """
+    Blocks until the next message has arrived and returns it.
+    Raises ConnectionError if the peer closes the connection first.
+    """
+    def recv_message(self):
+        message = self.next_buffered()
+        while message is None:
+            self.fill()
+            message = self.next_buffered()
+        return message
+
+"""
+TokenBucket class rate limits the messages of one connection.
+The bucket holds up to `burst` tokens and refills at `rate` tokens per
+second; every message takes one token.
+"""
+class TokenBucket:
+    __slots__ = ("rate", "burst", "tokens", "updated")
+
+    def __init__(self, rate=MESSAGE_RATE, burst=MESSAGE_BURST):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    """
+    Takes a token for one message. Returns False if the bucket is empty,
+    in which case the message should be dropped.
+    """
+    def take(self):
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+"""
+MessageWriter class queues frames for a non-blocking socket.
+Frames are sent immediately as far as the socket takes them; the rest waits
+in the queue until the socket is writable again. The queue is limited to
+`limit` bytes, so a client that stops reading cannot make the server buffer
+without bound: write() refuses the frame and the caller drops the client.
+Frames are kept as memoryviews, so one encoded frame can be queued for many
+connections without being copied.
+"""
+class MessageWriter:
+    def __init__(self, sock, limit=OUTBOX_LIMIT):
+        sock.setblocking(False)
+        self.sock = sock
+        self.chunks = collections.deque()  # Frames, or the unsent tail of the first one
+        self.queued = 0  # Bytes waiting in chunks
+        self.limit = limit
+
+    """
+    Queues one encoded frame and sends what the socket takes right away.
+    Returns False if the frame would exceed the queue limit or the
+    connection is broken. A frame larger than the limit is still accepted
+    when nothing else is queued.
+    """
+    def write(self, data):
+        if self.queued and self.queued + len(data) > self.limit:
+            return False
+        self.chunks.append(memoryview(data))
+        self.queued += len(data)
+        try:
+            self.flush()
+        except OSError:
+            return False
+        return True
+
+    """
+    Sends queued bytes until the queue is empty or the socket would block.
+    Returns True once everything has been sent. Raises OSError if the
+    connection is broken.
+    """
+    def flush(self):
+        while self.chunks:
+            chunk = self.chunks[0]
+            try:
+                sent = self.sock.send(chunk)
+            except (BlockingIOError, InterruptedError):
+                return False
+            self.queued -= sent
+            if sent < len(chunk):
+                self.chunks[0] = chunk[sent:]
+                return False
+            self.chunks.popleft()
+        return True
+
+"""
+Reads the next message from an asyncio StreamReader.
+Raises asyncio.IncompleteReadError if the peer closes the connection first.
+"""
+async def read_message(reader):
+    length, kind = unpack_header(await reader.readexactly(HEADER.size))
+    payload = await reader.readexactly(length)
+    return decode_payload(kind, payload)
+
+"""
+Writes one message to an asyncio StreamWriter and waits until it is flushed.
+"""
+async def write_message(writer, message, binary=False):
+    writer.write(encode_message(message, binary))
+    await writer.drain()
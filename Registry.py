@@ -0,0 +1,170 @@
+"""
+This module keeps track of the games running on a server.
+It is shared by the threaded server (Server.py) and the asyncio server
+(AsyncServer.py).
+"""
+
+# Imports
+import threading
+
+"""
+GameRegistry class stores the games of one server by game id.
+Ids are handed out atomically, and the games that still have a free seat are
+kept in a separate index by game size, so listing them costs O(waiting)
+instead of a scan over every game. Seats are reserved under the same lock,
+so concurrent joins can never push a game past its game_size. Finished games are dropped from the
+registry so its memory stays bounded over long uptimes.
+All methods are safe to call from any thread; the lock is never held while
+doing I/O.
+"""
+class GameRegistry:
+    def __init__(self, first_id=1, id_step=1):
+        self.lock = threading.Lock()
+        self.next_id = first_id  # Next game id to hand out
+        self.id_step = id_step  # Distance between consecutive game ids
+        self.games = {}  # game_id -> game, for every game that has not finished
+        self.waiting = {}  # game_size -> {game_id: game}, oldest game first
+
+    """
+    Atomically allocates a game id, builds the game with factory(game_id)
+    and registers it as waiting for players. Returns the new game.
+    """
+    def create(self, factory):
+        with self.lock:
+            return self.add(factory)
+
+    """
+    Finds a seat for a player that wants any game of game_size players.
+    Atomically reserves a seat in the oldest waiting game of that size, or
+    creates a new game with factory(game_id) if none has a free seat.
+    Returns (game, created), where created tells whether the player is the
+    creator of a new game.
+    """
+    def match(self, game_size, factory):
+        with self.lock:
+            for game in self.waiting.get(game_size, {}).values():
+                if self.reserve(game):
+                    return game, False
+            return self.add(factory), True
+
+    """
+    Atomically reserves a seat in a game for a joining player.
+    Returns False if the game has already started or has no free seat left.
+    """
+    def reserve_seat(self, game):
+        with self.lock:
+            return self.reserve(game)
+
+    """
+    Gives back a seat reserved for a player that could not be seated, and
+    lists the game as waiting again if it had become full.
+    """
+    def release_seat(self, game):
+        with self.lock:
+            game.reserved -= 1
+            if game.status == 'waiting':
+                self.waiting.setdefault(game.game_size, {})[game.game_id] = game
+
+    """
+    Registers a new game built by factory(game_id). Must be called with the lock held.
+    """
+    def add(self, factory):
+        game_id = self.next_id
+        self.next_id += self.id_step
+        game = factory(game_id)
+        self.games[game_id] = game
+        if game.reserved < game.game_size:
+            self.waiting.setdefault(game.game_size, {})[game_id] = game
+        return game
+
+    """
+    Reserves a seat in a game, unindexing it once it is full.
+    Must be called with the lock held.
+    """
+    def reserve(self, game):
+        if game.status != 'waiting' or game.reserved >= game.game_size:
+            return False
+        game.reserved += 1
+        if game.reserved >= game.game_size:
+            self.unindex(game)
+        return True
+
+    """
+    Registers a game recovered from the journal under its old id, and makes
+    sure new games are never given that id again.
+    """
+    def restore(self, game):
+        with self.lock:
+            self.games[game.game_id] = game
+            if game.game_id >= self.next_id:
+                self.next_id = game.game_id + self.id_step
+
+    """
+    Removes a game whose lobby timed out, unless every free seat of it is
+    already promised to a joining player. Returns True if the game was
+    removed; a player still holding a reservation finds it expired.
+    """
+    def expire(self, game):
+        with self.lock:
+            if game.status == 'waiting' and game.reserved >= game.game_size:
+                return False
+            game.status = 'expired'
+            self.unindex(game)
+            self.games.pop(game.game_id, None)
+            return True
+
+    """
+    Returns the games that are running or waiting to be resumed.
+    """
+    def in_progress(self):
+        with self.lock:
+            return [game for game in self.games.values() if game.status in ('in_progress', 'recovering')]
+
+    """
+    Returns the game with the given id, or None if there is no such game.
+    """
+    def get(self, game_id):
+        return self.games.get(game_id)
+
+    """
+    Returns the ids of the games with a free seat, oldest first.
+    Only games of the given size are listed if game_size is set.
+    """
+    def waiting_ids(self, game_size=None):
+        with self.lock:
+            if game_size is not None:
+                return list(self.waiting.get(game_size, ()))
+            return [game_id for by_id in self.waiting.values() for game_id in by_id]
+
+    """
+    Marks a game as started and removes it from the waiting index.
+    """
+    def start(self, game):
+        with self.lock:
+            game.status = 'in_progress'
+            self.unindex(game)
+
+    """
+    Marks a game as finished and removes it from the registry.
+    """
+    def finish(self, game):
+        with self.lock:
+            game.status = 'finished'
+            self.unindex(game)
+            self.games.pop(game.game_id, None)
+
+    """
+    Removes a game from the waiting index. Must be called with the lock held.
+    """
+    def unindex(self, game):
+        by_id = self.waiting.get(game.game_size)
+        if by_id is not None:
+            by_id.pop(game.game_id, None)
+            if not by_id:
+                del self.waiting[game.game_size]
+
+    def __contains__(self, game_id):
+        return game_id in self.games
+
+    def __len__(self):
+        return len(self.games)
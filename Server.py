@@ -4,143 +4,508 @@ It manages multiple game instances, player connections, and game logic.
 """
 
 # Imports
-import json
+import argparse
+import os
+import selectors
+import signal
 import socket
 import threading
 import time
 
+from Engine import shutdown_pool, submit_search
+from Game import MOVE_ERRORS, WIN_LENGTH, GameState, default_win_length, turn_after
+from Journal import Journal, replay
+from Log import get_logger, setup_logging
+from Metrics import metrics, start_metrics_server
+from Protocol import (CLOSE_FLUSH_TIMEOUT, MessageReader, MessageWriter, ProtocolError, TokenBucket, encode_message,
+                      send_message)
+from Registry import GameRegistry
+from Spectators import SpectatorHub
+from Timers import TimerWheel
+
 # Define constants
 HOST = '127.0.0.1'  # Standard loopback IP address (localhost)
 PORT = 5000  # Port to listen on (non-privileged ports are > 1023)
-FORMAT = 'utf-8'  # Define the encoding format of messages from client-server
 ADDR = (HOST, PORT)  # Creating a tuple of IP+PORT
+GRACE_PERIOD = 30  # Seconds the seat of a disconnected player is held for it to resume
+HANDSHAKE_TIMEOUT = 10  # Seconds a new connection has to send its request
+LOBBY_TIMEOUT = 600  # Seconds a game waits for all its players before it is closed
+TURN_TIMEOUT = 120  # Seconds a player has to move before the game ends on a timeout
+
+# invalid_move frame of every reason a move is rejected for, encoded once
+REJECTIONS = {error: encode_message({"type": "invalid_move", "message": error}) for error in MOVE_ERRORS}
+
+# Global registry of the games on this server
+games = GameRegistry()
+
+# Journal of the running games, set by open_journal when persistence is enabled
+journal = None
+
+# Serves the spectators of every game of this process
+spectators = SpectatorHub()
+
+"""
+Timeouts class holds the deadlines a server enforces, in seconds, where 0
+turns a deadline off. Shard workers get theirs from the front acceptor.
+"""
+class Timeouts:
+    __slots__ = ("handshake", "lobby", "turn")
+
+    def __init__(self, handshake=HANDSHAKE_TIMEOUT, lobby=LOBBY_TIMEOUT, turn=TURN_TIMEOUT):
+        self.handshake = handshake
+        self.lobby = lobby
+        self.turn = turn
+
+# Deadlines of this server, replaced from the command line
+timeouts = Timeouts()
+
+# Runs the deadlines of every connection and game of this process
+timers = TimerWheel()
 
-# Global variable to store games
-games = {}
-game_id_counter = 1  # A counter to assign unique game IDs
+log = get_logger("server")
 
 """
 GameThread class manages an individual game instance.
-Handles game state, player connections, move validation, and win conditions.
+Handles player connections and the game flow on top of the shared GameState,
+which holds the board and the win conditions.
 Inherits from threading.Thread to handle multiple games concurrently.
+Once the game runs, every player connection is non-blocking and owns a
+MessageWriter, so the game thread never waits on a slow client's socket.
+Spectators are served by the SpectatorHub thread, which the game thread
+only hands its moves to. The lobby and turn timeouts are timers on the
+shared timer wheel, which flag the game and wake its thread up.
 """
-class GameThread(threading.Thread):
-    def __init__(self, game_id, creator_conn, creator_addr):
+class GameThread(GameState, threading.Thread):
+    __slots__ = ("lobby", "selector", "announced", "dropped", "waker", "returning", "away", "thinking", "state_lock",
+                 "watched", "expired", "turn_timer", "overdue")
+
+    def __init__(self, game_id, creator_conn, creator_addr, creator_reader, game_size, creator_deltas=False, bots=0,
+                 win_length=WIN_LENGTH, creator_binary=False):
         threading.Thread.__init__(self)
-        self.game_id = game_id
-        self.creator_conn = creator_conn
-        self.creator_addr = creator_addr
-        self.num_players = 1
-        self.board_size = (self.num_players + 1)  # Board is (x + 1)^2
-        self.board = [[" ", " ", " "], [" ", " ", " "], [" ", " ", " "]]  # Initialize an empty 3x3 board
-        self.players = {
-            1: {"conn": creator_conn, "addr": creator_addr, "symbol": self.generate_symbol(0)}
-        }
-        self.winner=None
-        self.game_over=False
-        self.turn=1 #first turn is for player 1 the creator of the game
-        self.status = 'waiting'  # New attribute to track the game status
-        self.game_size=0
-
-    """
-    Generates a unique symbol for each player.
-    Uses a combination of X, O, and Greek alphabet symbols to ensure
-    each player has a distinct marker on the board.
-    """
-    def generate_symbol(self, player_id):
-        # List of Greek symbols starting with "X", "O", "Δ", and continuing with Greek alphabet
-        greek_symbols = [
-            "X", "O", "Δ", "Λ", "Φ", "Ψ", "Ω", "Π", "Σ", "Θ",  # Starting with "X", "O", and Greek letters
-            "Α", "Β", "Γ", "Δ", "Ε", "Ζ", "Η", "Θ", "Ι", "Κ",  # Greek alphabet symbols
-            "Λ", "Μ", "Ν", "Ξ", "Ο", "Π", "Ρ", "Σ", "Τ", "Υ",
-            "Φ", "Χ", "Ψ", "Ω"
-        ]
-        # Return the Greek symbol corresponding to the self.num_players
-        return (greek_symbols[player_id % len(greek_symbols)])  # Loop over the Greek symbols list
+        GameState.__init__(self, game_id, creator_conn, creator_addr, creator_reader, creator_deltas, creator_binary)
+        self.new_board(game_size, win_length)
+        self.seat_bots(bots)
+        self.lobby = threading.Condition()  # Signalled by add_opponent whenever a player joins
+        self.selector = None  # Watches every player connection while the game is running
+        self.announced = False  # Whether the creator has been sent its player id
+        self.dropped = []  # Players whose outbound queue overflowed, to be disconnected
+        self.waker = None  # Socket pair that wakes the running game when a player resumes
+        self.returning = []  # Resume requests not picked up by the game thread yet
+        self.away = {}  # player_id -> monotonic deadline of the players whose seat is held
+        self.thinking = None  # Future of the move the bot whose turn it is is searching for
+        self.state_lock = threading.Lock()  # Lets SpectatorHub.watch copy the board between two moves
+        self.watched = False  # Whether the game has spectators, so its moves go to the hub
+        self.expired = False  # Set by the lobby timer when the players did not all arrive in time
+        self.turn_timer = None  # Timer of the current turn's timeout
+        self.overdue = None  # seq of the move the turn timer ran out on
 
     """
     Adds a new player to the game.
     Updates player count and assigns the new player a unique symbol.
+    Pushes the new player count to the creator and wakes up the game thread,
+    so the game starts as soon as the last player joins.
+    A player that cannot be sent its seat is unseated again and its seat
+    reservation given back, so the game keeps waiting for someone else.
+    """
+    def add_opponent(self, opponent_conn, opponent_addr, opponent_reader, deltas=False, binary=False):
+        with self.lobby:
+            if self.status == 'expired':  # Timed out between the seat reservation and now
+                send_message(opponent_conn, {"type": "error", "message": "The game has expired"})
+                opponent_conn.close()
+                return
+            #send the player its player id
+            player_id = self.seat_player(opponent_conn, opponent_addr, opponent_reader, deltas, binary)
+            try:
+                send_message(opponent_conn, self.seat_message(player_id))
+            except OSError:
+                del self.players[player_id]
+                self.num_players -= 1
+                games.release_seat(self)
+                self.lobby.notify()  # A lobby that timed out meanwhile can expire now
+                raise
+            log.debug("Player %d joined game %d", player_id, self.game_id)
+            log.debug("Game %d has %d / %d players", self.game_id, self.num_players, self.game_size)
+            try:
+                self.announce_creator()  # A joiner can get here before the game thread has run
+                send_message(self.creator_conn, {"type": "player_count", "count": self.num_players, "game_size": self.game_size})
+            except OSError as e:
+                log.warning("Error sending player count to the creator of game %d: %s", self.game_id, e)
+            self.lobby.notify()
+
+    """
+    Sends the creator its player id, unless that has already been done.
+    Must be called with the lobby lock held, so the player id always reaches
+    the creator before any player count.
+    """
+    def announce_creator(self):
+        if not self.announced:
+            self.announced = True
+            send_message(self.creator_conn, self.seat_message(1))
+
+    """
+    Seats a returning player in a game recovered from the journal.
+    The seat is found by its token. Returns the player id, or None if no
+    empty seat has that token.
     """
-    def add_opponent(self, opponent_conn, opponent_addr):
-        self.num_players += 1
-        player_id = self.num_players
-        #send the player its player id
-        player_id=str(player_id)
-        opponent_conn.send(player_id.encode(FORMAT))
-        print(f"Player {player_id} joined the game.")
-        player_id=int(player_id) #casting back to int
-        self.players[player_id] = {
-            "conn": opponent_conn,
-            "addr": opponent_addr,
-            "symbol": self.generate_symbol(player_id-1),
-        }
+    def reclaim_seat(self, conn, addr, reader, token, deltas=False, binary=False):
+        with self.lobby:
+            for player_id, player in self.players.items():
+                if player["conn"] is None and player["token"] == token:
+                    player.update(conn=conn, addr=addr, reader=reader, deltas=deltas, binary=binary)
+                    if player_id == 1:
+                        self.creator_conn, self.creator_addr = conn, addr
+                    send_message(conn, self.seat_message(player_id))
+                    log.info("Player %d reclaimed its seat in game %d", player_id, self.game_id)
+                    self.lobby.notify()
+                    return player_id
+        return None
+
+    """
+    Returns a player to its seat with a new connection, given the seat token.
+    A recovered game hands the seat back as reclaim_seat does. A running game
+    queues the connection for the game thread and wakes it up, and the game
+    thread replays the moves played after last_seq to the player.
+    Returns the player id, or None if the token holds no seat in this game.
+    """
+    def resume_seat(self, conn, addr, reader, token, last_seq, deltas=False, binary=False):
+        with self.lobby:
+            if self.status == 'recovering':
+                return self.reclaim_seat(conn, addr, reader, token, deltas, binary)
+            if self.status != 'in_progress' or self.waker is None:
+                return None
+            for player_id, player in self.players.items():
+                if player["token"] == token:
+                    self.returning.append((player_id, conn, addr, reader, deltas, binary, last_seq))
+                    self.waker[1].send(b"\0")
+                    return player_id
+        return None
 
     """
     Handles communication with a specific player.
     Processes moves and messages from the player.
     """
     def handle_player(self, player_id):
-        conn = self.players[player_id]["conn"]
+        reader = self.players[player_id]["reader"]
         while not self.game_over:
             try:
-                data = conn.recv(1024).decode(FORMAT)  # Process player moves here
-                print(f"Received data from Player {player_id}: {data}")
+                data = reader.recv_message()  # Process player moves here
+                log.debug("Received data from Player %d: %s", player_id, data)
             except Exception as e:
-                print(f"Error communicating with Player {player_id}: {e}")
+                log.warning("Error communicating with Player %d: %s", player_id, e)
                 break
 
     """
     Main game thread execution method.
-    Handles game initialization, player joining, and starts the game
-    when all players have connected.
+    Handles player joining and starts the game when all players have connected.
+    A game whose players have not all arrived within the lobby timeout is
+    closed instead.
     """
     def run(self):
-        conn = self.creator_conn
-        game_size = conn.recv(1024).decode(FORMAT)
-        game_size = int(game_size)
-        self.game_size = game_size
-        #modify self game as per the game size
-        self.board = [[" " for _ in range((game_size+1))] for _ in range((game_size+1))]
-        print("A new game has been created. Waiting for players...")
-        while self.num_players < game_size:  # Inner loop to wait for players
-                time.sleep(5)  # Sleep to avoid busy waiting
-                print(f"Current players: {self.num_players} / {game_size}")
-                num_players = str(self.num_players)
-                conn.send(num_players.encode(FORMAT))
-
-        print("All players have joined! The game is starting...")
-        self.status = 'in_progress'
+        recovered = self.status == 'recovering'
+        timer = timers.schedule(timeouts.lobby, self.expire_lobby) if timeouts.lobby else None
+        with self.lobby:
+            if recovered:
+                log.info("Game %d recovered, waiting for its players to return", self.game_id)
+            else:
+                self.announce_creator()
+                log.debug("Game %d created, waiting for %d players", self.game_id, self.game_size)
+            while not self.seated():  # Sleep until add_opponent or reclaim_seat signals a player
+                # Refused while every free seat is promised to a player about to arrive, and retried on
+                # every change, since a reservation can still be given back
+                if self.expired and games.expire(self):
+                    break
+                self.lobby.wait()
+        if timer is not None:
+            timer.cancel()
+        if self.status == 'expired':
+            self.reap_lobby(recovered)
+            return
+
+        log.debug("All players have joined game %d, the game is starting", self.game_id)
+        games.start(self)
+        metrics.inc("games_started")
+        if journal is not None and not recovered:
+            journal.game_started(self)
         self.start_game()
-        print("Game finished.")
-        self.notify_players("A player has left.")
+        log.debug("Game %d finished", self.game_id)
+        games.finish(self)
+        if journal is not None:
+            journal.game_finished(self)
+        metrics.inc("games_finished")
+        self.close()
 
     """
-    Sends the current board state to all players.
-    Formats the board as a string and sends it to each connected player.
+    Returns True once every seat has its player: every player has joined a
+    new game, or every player has returned to a recovered one.
+    Must be called with the lobby lock held.
     """
-    def send_board(self):
-        board_state = "\n".join([" | ".join(row) for row in self.board])
-        board_message = f"Current Board:\n{board_state}\n"
-        for player_id, player in self.players.items():
-            conn = player["conn"]
-            try:
-                conn.send(board_message.encode(FORMAT))  # Send the board as a string
-            except Exception as e:
-                print(f"Error sending board to Player {player_id}: {e}")
+    def seated(self):
+        if self.status == 'recovering':
+            return all(player["conn"] is not None or player["bot"] for player in self.players.values())
+        return self.num_players >= self.game_size
 
     """
-     Receives and processes messages from all players.
-     Used to ensure synchronization between players.
-     """
-    def recv_message(self):
+    Timer callback: flags the lobby as timed out and wakes the game thread.
+    """
+    def expire_lobby(self):
+        with self.lobby:
+            self.expired = True
+            self.lobby.notify()
+
+    """
+    Closes a game whose players did not all arrive in time. The players
+    already seated and the spectators are told, and a recovered game is
+    dropped from the journal.
+    """
+    def reap_lobby(self, recovered):
+        metrics.inc("games_reaped")
+        log.info("Game %d timed out waiting for its players", self.game_id)
+        if recovered and journal is not None:
+            journal.game_finished(self)
+        message = {"type": "game_over", "reason": "timeout", "player": None}
+        for player in self.players.values():
+            if player["conn"] is not None:
+                try:
+                    send_message(player["conn"], message)
+                except OSError:
+                    pass  # Already gone
+        with self.state_lock:
+            self.game_over = True
+        if self.watched:
+            spectators.finish(self, message)
+        self.close()
+
+    """
+    Sends the update for the move just played at (row, col) to all players,
+    as built by update_frames.
+    """
+    def send_update(self, row, col):
+        with metrics.timer("broadcast"):
+            self.send_frames(self.update_frames(row, col))
+
+    """
+    Queues one encoded frame per player without blocking.
+    Players whose queue would overflow, or whose connection is broken, are
+    marked to be dropped.
+    """
+    def send_frames(self, frames):
+        for player_id, data in frames.items():
+            writer = self.players[player_id]["writer"]
+            if writer is not None and not writer.write(data):  # Players away get the missed moves on resume
+                self.drop_player(player_id)
+
+    """
+    Marks a player as a slow consumer. next_message disconnects it like a
+    lost connection, so the player can resume once it reads again.
+    """
+    def drop_player(self, player_id):
+        if player_id not in self.dropped:
+            metrics.inc("players_dropped")
+            log.warning("Dropping Player %d of game %d with %d bytes queued", player_id, self.game_id,
+                        self.players[player_id]["writer"].queued)
+            self.dropped.append(player_id)
+
+    """
+    Watches the connections that have queued bytes for writability as well.
+    """
+    def watch_writes(self):
         for player_id, player in self.players.items():
-            conn = player["conn"]
+            if player["conn"] is None:
+                continue
+            events = selectors.EVENT_READ | (selectors.EVENT_WRITE if player["writer"].chunks else 0)
+            if self.selector.get_key(player["conn"]).events != events:
+                self.selector.modify(player["conn"], events, player_id)
+
+    """
+    Waits until any player has sent a message and returns (player_id, message).
+    Messages already buffered by a reader are returned before waiting on the
+    sockets again, and queued outbound bytes are flushed while waiting.
+    Messages beyond a connection's rate limit are dropped.
+    A lost connection or a dropped slow consumer only puts the player away,
+    and players resuming meanwhile are given their seat back. A player whose
+    grace period ran out is reported as an exit message, and one whose turn
+    timed out as a timeout message.
+    """
+    def next_message(self):
+        while True:
+            if self.thinking is not None and self.thinking.done():
+                return self.turn, self.bot_move()
+            if self.overdue is not None:
+                seq, self.overdue = self.overdue, None
+                if seq == self.seq and self.turn is not None:
+                    return self.turn, {"type": "timeout"}
+            if self.dropped:
+                self.hold_seat(self.dropped.pop(0))
+                continue
+            if self.returning:
+                with self.lobby:
+                    returning, self.returning = self.returning, []
+                for entry in returning:
+                    self.return_player(*entry)
+            now = time.monotonic()
+            for player_id, deadline in self.away.items():
+                if deadline <= now:
+                    log.info("Player %d of game %d did not come back in time", player_id, self.game_id)
+                    return player_id, {"type": "exit"}
+            for player_id, player in self.players.items():
+                if player["reader"] is None:
+                    continue  # Away
+                try:
+                    message = player["reader"].next_buffered()
+                except ProtocolError as e:
+                    log.warning("Error communicating with Player %d: %s", player_id, e)
+                    self.hold_seat(player_id)
+                    break
+                if message is None:
+                    continue
+                if player["bucket"].take():
+                    return player_id, message
+                metrics.inc("messages_rate_limited")
+                break  # Look again without waiting, the reader may hold more
+            else:
+                self.wait_for_players(now)
+
+    """
+    Waits until a player connection is readable or writable, a player resumes
+    or the earliest grace period of a player away runs out.
+    """
+    def wait_for_players(self, now):
+        self.watch_writes()
+        timeout = max(0, min(self.away.values()) - now) if self.away else None
+        for key, events in self.selector.select(timeout):
+            player_id = key.data
+            if player_id is None:
+                self.waker[0].recv(4096)  # next_message picks up the returning players
+                continue
             try:
-                message = conn.recv(1024).decode(FORMAT)  # Receiving from client message
-                print(message)
-            except Exception as e:
-                print(f"Error sending board to Player {player_id}: {e}")
+                if events & selectors.EVENT_WRITE:
+                    self.players[player_id]["writer"].flush()
+                if events & selectors.EVENT_READ:
+                    self.players[player_id]["reader"].fill()
+            except BlockingIOError:
+                pass  # Woken up without data after all; select again
+            except OSError as e:
+                log.warning("Error communicating with Player %d: %s", player_id, e)
+                self.hold_seat(player_id)
+                return  # The selected keys of this player are stale now
+
+    """
+    Starts the timeout of the turn that has just begun, replacing the one of
+    the previous turn. Bots always move within their search budget, so
+    their turns are not timed.
+    """
+    def time_turn(self):
+        if self.turn_timer is not None:
+            self.turn_timer.cancel()
+            self.turn_timer = None
+        if timeouts.turn and self.turn is not None and not self.bot_turn():
+            seq = self.seq
+            self.turn_timer = timers.schedule(timeouts.turn, lambda: self.turn_overdue(seq))
+
+    """
+    Timer callback: flags the turn that began after move seq as timed out
+    and wakes the game thread, which ends the game unless a move came first.
+    """
+    def turn_overdue(self, seq):
+        with self.lobby:
+            self.overdue = seq
+            if self.waker is not None:
+                self.waker[1].send(b"\0")
+
+    """
+    Starts the search for the move of the bot whose turn it is, if any.
+    The search runs in the bots' process pool; once it is done, the waker
+    socket makes next_message return the bot's move like any other.
+    """
+    def ask_bot(self):
+        if not self.bot_turn():
+            return
+        asked_at = time.perf_counter()
+
+        def done(future):
+            metrics.observe("bot_move", time.perf_counter() - asked_at)
+            with self.lobby:
+                if self.waker is not None:
+                    self.waker[1].send(b"\0")
+
+        self.thinking = submit_search(self.board.cells[:], self.board.size, self.board.win_length, self.turn,
+                                      self.game_size)
+        self.thinking.add_done_callback(done)
+
+    """
+    Returns the move message of the bot whose search has finished.
+    """
+    def bot_move(self):
+        future, self.thinking = self.thinking, None
+        metrics.inc("bot_moves")
+        return self.searched_move(future)
+
+    """
+    Holds the seat of a player whose connection was lost for GRACE_PERIOD
+    seconds and tells the others. The player can resume meanwhile.
+    """
+    def hold_seat(self, player_id):
+        player = self.players[player_id]
+        if player["conn"] is None:
+            return
+        self.selector.unregister(player["conn"])
+        player["conn"].close()
+        player.update(conn=None, reader=None, writer=None)
+        self.away[player_id] = time.monotonic() + GRACE_PERIOD
+        metrics.inc("players_away")
+        log.info("Player %d of game %d is away, holding its seat for %d seconds", player_id, self.game_id, GRACE_PERIOD)
+        self.notify_players({"type": "player_away", "player": player_id, "grace": GRACE_PERIOD})
+
+    """
+    Seats a resuming player on its new connection and sends it the frame
+    built by resume_frame. A connection still open for the seat is replaced,
+    so a client may resume before the server noticed it left.
+    """
+    def return_player(self, player_id, conn, addr, reader, deltas, binary, last_seq):
+        player = self.players[player_id]
+        if player["conn"] is not None:
+            self.selector.unregister(player["conn"])
+            player["conn"].close()
+        self.away.pop(player_id, None)
+        player.update(conn=conn, addr=addr, reader=reader, deltas=deltas, binary=binary, writer=MessageWriter(conn),
+                      bucket=TokenBucket())
+        if player_id == 1:
+            self.creator_conn, self.creator_addr = conn, addr
+        self.selector.register(conn, selectors.EVENT_READ, player_id)
+
+        frame, replayed = self.resume_frame(player_id, last_seq, deltas, binary)
+        self.send_frames({player_id: frame})
+        metrics.inc("moves_replayed", replayed)
+        log.info("Player %d resumed game %d at seq %s of %d", player_id, self.game_id, last_seq, self.seq)
+        data = encode_message({"type": "player_back", "player": player_id})
+        self.send_frames({other: data for other in self.players if other != player_id})
+
+    """
+    Waits for the player whose turn it is to play a move.
+    Serves resync requests from any player in the meantime, and answers
+    moves that cannot be played with invalid_move.
+    Returns (player_id, message) for a legal move, for the exit message of
+    any player that left or lost its connection, or for the timeout of the
+    player whose turn it is.
+    """
+    def recv_move(self):
+        while True:
+            player_id, message = self.next_message()
+            if message["type"] in ("exit", "timeout"):
+                return player_id, message
+            if message["type"] == "resync":
+                metrics.inc("resyncs")
+                self.send_frames({player_id: encode_message(self.snapshot_message(), self.players[player_id]["binary"])})
+            elif message["type"] == "move":
+                error = self.move_error(player_id, message)
+                if error is None:
+                    return player_id, message
+                metrics.inc("moves_rejected")
+                log.debug("Rejecting move of Player %d: %s", player_id, error)
+                self.send_frames({player_id: REJECTIONS[error]})
+            else:
+                metrics.inc("messages_ignored")
+                log.debug("Ignoring unexpected message from Player %d: %s", player_id, message)
 
     """
     Manages the main game loop.
@@ -148,187 +513,361 @@ class GameThread(threading.Thread):
     Continues until the game is over (win, tie, or player disconnection).
     """
     def start_game(self):
-        print("Game has started successfully.")
-        self.send_board()
-        self.recv_message()
-        self.turn=0
+        log.debug("Game %d has started", self.game_id)
+        self.selector = selectors.DefaultSelector()
+        with self.lobby:
+            self.waker = socket.socketpair()
+        self.waker[0].setblocking(False)
+        self.selector.register(self.waker[0], selectors.EVENT_READ, None)
+        for player_id, player in self.players.items():
+            if player["bot"]:
+                player["writer"] = None  # Bots read the board straight from the game
+                continue
+            player["writer"] = MessageWriter(player["conn"])  # Makes the connection non-blocking
+            player["bucket"] = TokenBucket()
+            self.selector.register(player["conn"], selectors.EVENT_READ, player_id)
+        self.turn = turn_after(self.seq, self.game_size) #first turn is for player 1 the creator of the game, a recovered game goes on
+        self.notify_players(self.snapshot_message())
+        self.ask_bot()
+        self.time_turn()
         while(self.game_over==False):
-            self.turn = (self.turn % self.game_size) + 1
-            message=f"player {self.turn} turn"
-            self.notify_players(message)
-            player_conn = self.players[self.turn]["conn"]
-            turn = player_conn.recv(1024).decode(FORMAT)
-            if (turn == 'e'): #disconnect player from server and end the game
-                self.notify_players(f"player {self.turn} left the game")
-                self.players[self.turn]["conn"].close()
-                self.players.pop(self.turn, None)
+            player_id, turn = self.recv_move()
+            received_at = time.perf_counter()
+            if (turn["type"] == "timeout"): #the player to move is still told, along with the others
+                metrics.inc("turns_timed_out")
+                log.info("Player %d of game %d ran out of time", player_id, self.game_id)
+                self.turn = None
+                self.end_game({"type": "game_over", "reason": "timeout", "player": player_id})
+                break
+            if (turn["type"] == "exit"): #disconnect player from server and end the game
+                metrics.inc("players_left")
+                player = self.players.pop(player_id)
+                self.away.pop(player_id, None)
+                if player["conn"] is not None:
+                    self.selector.unregister(player["conn"])
+                    player["conn"].close()
                 self.num_players=self.num_players-1
-                self.game_over = True
+                self.turn = None
+                self.end_game({"type": "game_over", "reason": "left", "player": player_id})
                 break
-            turn = turn.strip('()')
-            row, col = map(int, turn.split(','))
-            self.board[row][col]=self.players[self.turn]["symbol"]
-            self.send_board()
-            if(self.check_winner()==self.players[self.turn]["symbol"]):
-                self.notify_players(f"player {self.turn} won\n")
-                self.game_over=True
+            row, col = int(turn["row"]), int(turn["col"])
+            with self.state_lock:
+                with metrics.timer("check_winner"):
+                    result = self.play_turn(row, col)  # Only the lines through the new cell are checked
+                watched = self.watched  # A spectator joining after this already sees the move
+            if journal is not None:
+                journal.move_played(self, row, col, player_id)
+            self.send_update(row, col)
+            if watched:
+                spectators.moved(self, row, col)  # After the players' frames, and without waiting
+            self.ask_bot()
+            self.time_turn()
+            metrics.observe("move", time.perf_counter() - received_at)
+            metrics.inc("moves")
+            if(result==self.players[player_id]["symbol"]):
+                self.end_game({"type": "game_over", "reason": "won", "player": player_id})
                 break
 
-            if (self.check_winner() == "Tie"):
-                self.notify_players("Tie")
-                self.game_over = True
+            if (result == "Tie"):
+                self.end_game({"type": "game_over", "reason": "tie", "player": None})
                 break
 
     """
-    Check if there is a winner in the game.
-    Returns:
-        str: Symbol of the winner if there is one (e.g., 'X' or 'O'),
-             'Tie' if the board is full with no winner,
-             False if the game is still ongoing.
-    """
-    def check_winner(self):
-        size = len(self.board)  # Get the size of the board
-
-        # Check rows for a winner
-        for row in self.board:
-            for start in range(size - 2):
-                if row[start] == row[start + 1] == row[start + 2] and row[start] != " ":
-                    return row[start]  # Return the winning symbol
-
-        # Check columns for a winner
-        for col in range(size):
-            for start in range(size - 2):
-                if (
-                        self.board[start][col] == self.board[start + 1][col] == self.board[start + 2][col]
-                        and self.board[start][col] != " "
-                ):
-                    return self.board[start][col]  # Return the winning symbol
-
-        # Check diagonals (top-left to bottom-right) for a winner
-        for row in range(size - 2):
-            for col in range(size - 2):
-                if (
-                        self.board[row][col] == self.board[row + 1][col + 1] == self.board[row + 2][col + 2]
-                        and self.board[row][col] != " "
-                ):
-                    return self.board[row][col]  # Return the winning symbol
-
-        # Check diagonals (top-right to bottom-left) for a winner
-        for row in range(size - 2):
-            for col in range(2, size):
-                if (
-                        self.board[row][col] == self.board[row + 1][col - 1] == self.board[row + 2][col - 2]
-                        and self.board[row][col] != " "
-                ):
-                    return self.board[row][col]  # Return the winning symbol
-
-        # Check for a tie (no empty spaces left)
-        if all(cell != " " for row in self.board for cell in row):
-            return "Tie"  # The board is full with no winner
-
-        # Game is still ongoing
-        return False
+    Sends the game_over message to the players and the spectators.
+    """
+    def end_game(self, message):
+        self.notify_players(message)
+        with self.state_lock:
+            self.game_over = True  # No spectator can join after this
+        if self.watched:
+            spectators.finish(self, message)
 
     """
     Sends a message to all connected players.
     Used for game updates, board states, and game end notifications.
+    The frames come from message_frames.
     """
     def notify_players(self, message):
-        """
-        Send a message to all players.
-        The message can be the game board or any other text message.
-        """
-        for self.num_players, player in self.players.items():
-            conn = player["conn"]
-            try:
-                # Sending the message to the player
-                conn.send(message.encode(FORMAT))  # Message must be encoded as bytes
-            except Exception as e:
-                print(f"Error sending message to player {self.num_players}: {e}")
+        with metrics.timer("broadcast"):
+            self.send_frames(self.message_frames(message))
+
+    """
+    Sends the bytes still queued for the players, giving up after timeout
+    seconds, so the last messages of a game reach everyone who still reads.
+    """
+    def flush_players(self, timeout):
+        deadline = time.monotonic() + timeout
+        with selectors.DefaultSelector() as selector:
+            for player in self.players.values():
+                if player.get("writer") is not None and player["writer"].chunks:  # Players away have no writer
+                    selector.register(player["conn"], selectors.EVENT_WRITE, player["writer"])
+            while selector.get_map() and deadline > time.monotonic():
+                for key, _ in selector.select(deadline - time.monotonic()):
+                    try:
+                        done = key.data.flush()
+                    except OSError:
+                        done = True  # Nobody left to send to
+                    if done:
+                        selector.unregister(key.fileobj)
+
+    """
+    Closes the connections of all remaining players once the game is over,
+    along with those of players that tried to resume too late.
+    """
+    def close(self):
+        if self.turn_timer is not None:
+            self.turn_timer.cancel()
+        self.flush_players(CLOSE_FLUSH_TIMEOUT)
+        if self.selector is not None:
+            self.selector.close()
+        for player in self.players.values():
+            if player["conn"] is not None:
+                player["conn"].close()
+        with self.lobby:
+            returning, self.returning = self.returning, []
+            if self.waker is not None:
+                for end in self.waker:
+                    end.close()
+                self.waker = None
+        for entry in returning:
+            entry[1].close()
 
 """
 Creates a new game instance with the given connection and address.
 Returns a dictionary containing game information including game_id, creator, and board.
-Updates the global games dictionary with the new game instance.
+Registers the new game instance in the global games registry.
+The next `bots` seats after the creator's go to server-side bot players,
+and win_length pieces in a row win the game.
 """
-def create_new_game(conn, addr):
-    global game_id_counter, games
-    game = GameThread(game_id_counter, conn, addr)
-    games[game_id_counter] = game
-    game_id_counter += 1
+def create_new_game(conn, addr, reader, game_size, deltas=False, bots=0, win_length=WIN_LENGTH, binary=False):
+    game = games.create(lambda game_id: GameThread(game_id, conn, addr, reader, game_size, deltas, bots, win_length,
+                                                   binary))
     game.start()  # Start the game thread
     return {"game_id": game.game_id, "creator": addr, "board": game.board}
 
+"""
+Timer callback: shuts down a connection that did not send its request in
+time, which makes the read waiting for it fail.
+"""
+def reap_connection(conn, addr):
+    metrics.inc("handshakes_reaped")
+    log.info("[HANDSHAKE TIMEOUT] on address: %s", addr)
+    try:
+        conn.shutdown(socket.SHUT_RDWR)
+    except OSError:
+        pass  # Closed meanwhile
+
+"""
+Reads one request of a connection's handshake. The read still blocks, but
+the timer wheel shuts the connection down once timeout seconds have passed,
+so a client that never sends anything cannot hold its thread forever.
+Raises TimeoutError if the request arrived too late to be served.
+"""
+def recv_handshake(conn, addr, reader, timeout):
+    if not timeout:
+        return reader.recv_message()
+    timer = timers.schedule(timeout, lambda: reap_connection(conn, addr))
+    try:
+        request = reader.recv_message()
+    finally:
+        reaped = not timer.cancel()
+    if reaped:
+        raise TimeoutError("Handshake timed out")
+    return request
+
 """
 Handles initial client connection and game setup.
-Processes requests for creating new games or joining existing ones.
+Processes requests for creating new games, joining existing ones, or
+being matched into any game of a given size.
 Manages the client's connection state throughout the game.
+accepted_at is the perf_counter time the connection was accepted at.
 """
-def handle_client1(conn, addr):
-    print('[CLIENT CONNECTED] on address: ', addr)  # Printing connection address
-    Choose_Game = conn.recv(1024).decode(FORMAT)  # Receiving from client # of messages to expect
-    Choose_Game=int(Choose_Game) #casting to int
-    received = 0
+def handle_client1(conn, addr, accepted_at=None):
+    if accepted_at is not None:
+        metrics.observe("accept", time.perf_counter() - accepted_at)  # Time to get a thread running
+    log.debug("[CLIENT CONNECTED] on address: %s", addr)
+    reader = MessageReader(conn)
 
     try:
-    #case for joining an existing game
-       if (Choose_Game==1):
-            print(f"The following available game rooms are:\n{games}")
-            #send the available games to the client
-            time.sleep(0.5)
-            available_games = {game_id: game for game_id, game in games.items() if game.status == 'waiting'}
-            print(f"The following available game rooms are:\n{list(available_games.keys())}")
+        request = recv_handshake(conn, addr, reader, timeouts.handshake)
+    except Exception:
+        log.info("[CLIENT CONNECTION INTERRUPTED] on address: %s", addr)
+        conn.close()
+        return
+    handle_request(conn, addr, reader, request)
+
+"""
+Serves the first request of a client connection, which has already been read.
+Also used by the shard workers of ShardedServer.py, which receive the
+connection together with its first request from the front acceptor.
+"""
+def handle_request(conn, addr, reader, request):
+    try:
+        #case for listing the games before joining one
+        if (request["type"] == "list"):
+            available_games = games.waiting_ids()
+            log.debug("The following available game rooms are: %s", available_games)
 
             # Check if there are any available games
             if not available_games:
-                conn.send("No available games at the moment.".encode(FORMAT))
+                send_message(conn, {"type": "error", "message": "No available games at the moment."})
+                conn.close()
                 return
-            available_games_json = json.dumps(list(available_games.keys()))
-            conn.send(available_games_json.encode(FORMAT))
-            game_id = conn.recv(1024).decode(FORMAT)
-            game_id = int(game_id)
-            print(f"Client wants to join game {game_id}")
-            if game_id in games:
-                game = games[game_id]
-                game.add_opponent(conn, addr)
+            send_message(conn, {"type": "games", "games": available_games})
+            request = recv_handshake(conn, addr, reader, timeouts.handshake)
+
+        deltas = bool(request.get("deltas"))
+        binary = bool(request.get("binary"))  # Boards, deltas and moves as binary payloads
+        #case for returning to a seat after a disconnect or a server restart
+        if (request["type"] == "resume"):
+            game = games.get(int(request["game_id"]))
+            last_seq = request.get("last_seq")
+            last_seq = None if last_seq is None else int(last_seq)
+            if game is None or game.resume_seat(conn, addr, reader, str(request["token"]), last_seq, deltas,
+                                                binary) is None:
+                metrics.inc("resumes_rejected")
+                send_message(conn, {"type": "error", "message": "No seat to return to"})
+                conn.close()
             else:
-                conn.send("Invalid game ID".encode(FORMAT))
-
-
-       elif(Choose_Game==2):
-           Start_Game = True
-           print("Creating a new game")
-           game_board = create_new_game(conn, addr) #creates a new game thread
+                metrics.inc("resumes")
+
+        #case for watching a game without playing in it
+        elif (request["type"] == "watch"):
+            game = games.get(int(request["game_id"]))
+            if game is None or not spectators.watch(game, conn):
+                send_message(conn, {"type": "error", "message": "Invalid game ID"})
+                conn.close()
+            else:
+                metrics.inc("spectators_joined")
+
+        #case for joining an existing game
+        elif (request["type"] == "join"):
+            game_id = int(request["game_id"])
+            log.debug("Client wants to join game %d", game_id)
+            game = games.get(game_id)
+            if game is None:
+                metrics.inc("joins_rejected")
+                send_message(conn, {"type": "error", "message": "Invalid game ID"})
+                conn.close()
+            elif not games.reserve_seat(game):
+                metrics.inc("joins_rejected")
+                send_message(conn, {"type": "error", "message": "The game is already full"})
+                conn.close()
+            else:
+                with metrics.timer("join"):
+                    game.add_opponent(conn, addr, reader, deltas, binary)
+                metrics.inc("joins")
+
+        elif (request["type"] in ("create", "match")):
+            game_size = int(request["game_size"])
+            if game_size < 1:
+                send_message(conn, {"type": "error", "message": "Invalid number of players"})
+                conn.close()
+                return
+            # Matched games are found by size alone, so they always get the default length
+            win_length = default_win_length(game_size)
+            if (request["type"] == "create"):
+                win_length = int(request.get("win_length", win_length))
+            if not 2 <= win_length <= game_size + 1:
+                send_message(conn, {"type": "error", "message": "Invalid win length"})
+                conn.close()
+                return
+            if (request["type"] == "create"):
+                bots = int(request.get("bots", 0))
+                if not 0 <= bots < game_size:
+                    send_message(conn, {"type": "error", "message": "Invalid number of bots"})
+                    conn.close()
+                    return
+                log.debug("Creating a new game")
+                create_new_game(conn, addr, reader, game_size, deltas, bots, win_length, binary) #creates a new game thread
+                metrics.inc("games_created")
+                metrics.inc("bots_seated", bots)
+            else:
+                #case for matchmaking: take a seat in any waiting game of this size
+                game, created = games.match(game_size, lambda game_id: GameThread(game_id, conn, addr, reader, game_size, deltas,
+                                                                                  win_length=win_length, creator_binary=binary))
+                log.debug("Matched client into game %d", game.game_id)
+                metrics.inc("matches")
+                if created:
+                    game.start()  # Start the game thread
+                    metrics.inc("games_created")
+                else:
+                    with metrics.timer("join"):
+                        game.add_opponent(conn, addr, reader, deltas, binary)
+                    metrics.inc("joins")
+
+        else:
+            metrics.inc("requests_rejected")
+            send_message(conn, {"type": "error", "message": "Unknown request"})
+            conn.close()
+
+    except Exception:
+        log.info("[CLIENT CONNECTION INTERRUPTED] on address: %s", addr)
+        conn.close()
 
 
-    except:
-         print("[CLIENT CONNECTION INTERRUPTED] on address: ", addr)
+"""
+Recovers the games kept in the journal at path and starts journaling.
+Every recovered game waits for its players to reclaim their seats with the
+"resume" request. Games whose journaled board is already won or full
+only missed their end record and are not resumed.
+"""
+def open_journal(path):
+    global journal
+    for state in replay(path):
+        game = GameThread(state["game_id"], None, None, None, state["game_size"])
+        game.restore(state["game_size"], state["cells"], state["seats"], state["win_length"])
+        if game.check_winner():
+            continue
+        games.restore(game)
+        game.start()
+        metrics.inc("games_recovered")
+    journal = Journal(path, games.in_progress)
+    log.info("Journaling games to %s, %d games recovered", path, len(games))
 
+"""
+SIGTERM handler: writes the queued journal records and exits right away,
+without waiting for the running games, so a restarted server can recover them.
+The bots' worker processes are stopped first.
+"""
+def shutdown(signum, frame):
+    shutdown_pool()
+    if journal is not None:
+        journal.close()
+    os._exit(0)
 
 """
 Initializes and starts the server.
 Creates a socket, binds it to the specified address and port,
 and listens for incoming connections.
 Spawns a new thread for each connected client.
+With journal_path set, in-progress games are journaled to that file and
+recovered from it on startup.
 """
-def start_server():
+def start_server(host=HOST, port=PORT, journal_path=None):
+    if journal_path is not None:
+        open_journal(journal_path)
     server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-    server_socket.bind(ADDR)
+    server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)  # Allow quick restarts on the same port
+    server_socket.bind((host, port))
     server_socket.listen()
+    metrics.gauge("games_active", lambda: len(games))
 
-    print(f"[LISTENING] server is listening on {HOST}:{PORT}")
+    log.info("[LISTENING] server is listening on %s:%d", host, port)
 
     while True:
         try:
             connection, address = server_socket.accept()
-            print(f"[NEW CONNECTION] {address} connected.")
+            accepted_at = time.perf_counter()
+            metrics.inc("connections_accepted")
+            log.debug("[NEW CONNECTION] %s connected.", address)
 
             # Create a new thread to handle the client
-            client_thread = threading.Thread(target=handle_client1, args=(connection, address))
+            client_thread = threading.Thread(target=handle_client1, args=(connection, address, accepted_at))
             client_thread.start()
 
         except Exception as e:
-            print(f"Error accepting connection: {e}")
+            log.warning("Error accepting connection: %s", e)
 
         # on this process (opening another thread for next client to come!)
 
@@ -336,10 +875,47 @@ def start_server():
 # Server initialization code
 # Main
 if __name__ == '__main__':
-    server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)  # Opening Server socket
-
-    print("[STARTING] server is starting...")
-    start_server()
-
-    print("THE END!")
+    parser = argparse.ArgumentParser(description="Tic Tac Toe server")
+    parser.add_argument("--async", dest="use_async", action="store_true",
+                        help="serve all clients from a single asyncio event loop instead of a thread per connection")
+    parser.add_argument("--shards", type=int, metavar="N",
+                        help="run N worker processes behind a front acceptor (Unix only)")
+    parser.add_argument("--host", default=HOST, help="address to listen on")
+    parser.add_argument("--port", type=int, default=PORT, help="port to listen on")
+    parser.add_argument("--log-level", default="INFO", choices=["DEBUG", "INFO", "WARNING", "ERROR"],
+                        help="lowest level of the log messages to print")
+    parser.add_argument("--metrics-port", type=int,
+                        help="serve metrics and the sampling profiler over HTTP on this port")
+    parser.add_argument("--journal", metavar="PATH",
+                        help="journal in-progress games to PATH and recover them from it on startup")
+    parser.add_argument("--handshake-timeout", type=float, default=HANDSHAKE_TIMEOUT, metavar="SECONDS",
+                        help="close connections that do not send their request in time (0 to wait forever)")
+    parser.add_argument("--lobby-timeout", type=float, default=LOBBY_TIMEOUT, metavar="SECONDS",
+                        help="close games whose players do not all join in time (0 to wait forever)")
+    parser.add_argument("--turn-timeout", type=float, default=TURN_TIMEOUT, metavar="SECONDS",
+                        help="end games whose player to move does not move in time (0 to wait forever)")
+    args = parser.parse_args()
+    if args.journal and args.use_async:
+        parser.error("--journal is only supported by the threaded and the sharded server")
+
+    timeouts = Timeouts(args.handshake_timeout, args.lobby_timeout, args.turn_timeout)
+
+    setup_logging(args.log_level)
+    if args.metrics_port is not None:
+        start_metrics_server(args.host, args.metrics_port)
+    log.info("[STARTING] server is starting...")
+    if args.shards is not None:
+        from ShardedServer import start_sharded_server
+        start_sharded_server(args.host, args.port, args.shards, args.log_level, args.metrics_port, args.journal,
+                             timeouts)
+    elif args.use_async:
+        import asyncio
+        from AsyncServer import start_async_server
+        signal.signal(signal.SIGTERM, shutdown)
+        asyncio.run(start_async_server(args.host, args.port, timeouts))
+    else:
+        signal.signal(signal.SIGTERM, shutdown)
+        start_server(args.host, args.port, args.journal)
+
+    log.info("THE END!")
 
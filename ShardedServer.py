@@ -0,0 +1,257 @@
+"""
+This is the sharded, multi-process deployment of the Tic Tac Toe server.
+A front acceptor process owns the listening socket and reads the first
+request of every connection. It then passes the connection's file
+descriptor, together with that request, to one of N worker processes. Each
+worker runs the threaded server from Server.py with its own interpreter and
+GIL, so move throughput grows with the number of cores.
+
+The game registry is partitioned: worker k hands out the game ids
+k+1, k+1+N, k+1+2N, ..., so the acceptor can send a join or a watch for any
+game id straight to the shard that owns it. New games are spread round-robin,
+matchmaking requests go to the shard owning their game size, and "list"
+requests are answered by asking every shard for its waiting games; a
+shard's answer is split over as many control records as it takes.
+
+Connections are passed over AF_UNIX SOCK_SEQPACKET socket pairs with
+SCM_RIGHTS, so this mode needs a Unix system. With a journal, worker k
+journals its games to PATH.k; the number of shards must then stay the same
+across restarts, since it decides which shard owns which game id.
+"""
+
+# Imports
+import itertools
+import multiprocessing
+import os
+import signal
+import socket
+import threading
+import time
+
+import Server
+from Log import get_logger, setup_logging
+from Metrics import metrics, start_metrics_server
+from Protocol import HEADER, MessageReader, decode_payload, encode_message, send_message, unpack_header
+from Registry import GameRegistry
+
+HANDOFF_SIZE = 1 << 16  # Largest control record: the first request plus any bytes read after it
+
+log = get_logger("sharded_server")
+
+"""
+Shard class is the acceptor's handle on one worker process.
+The control socket carries connection handoffs to the worker and the
+worker's answers to "list" queries; the lock keeps a query and its answer
+together when several handshake threads use the same shard.
+"""
+class Shard:
+    __slots__ = ("index", "process", "control", "lock")
+
+    def __init__(self, index, process, control):
+        self.index = index
+        self.process = process
+        self.control = control
+        self.lock = threading.Lock()
+
+    """
+    Passes a client connection and its first request to the worker.
+    Bytes the acceptor has already read past the request travel along, so
+    the worker's reader continues exactly where the acceptor's stopped.
+    The acceptor's copy of the connection is closed afterwards.
+    """
+    def hand_off(self, conn, reader, request):
+        record = encode_message(request) + bytes(reader.buffer)
+        if len(record) > HANDOFF_SIZE:
+            raise ValueError(f"Handshake of {len(record)} bytes does not fit a control record")
+        with self.lock:
+            socket.send_fds(self.control, [record], [conn.fileno()])
+        conn.close()
+
+    """
+    Returns the ids of the games waiting for players on this shard.
+    The answer may span several control records; the frame header at the
+    start of the first one tells how many bytes to expect.
+    """
+    def waiting_ids(self):
+        with self.lock:
+            self.control.send(encode_message({"type": "list"}))
+            record = bytearray(self.control.recv(HANDOFF_SIZE))
+            length, _ = unpack_header(record[:HEADER.size])
+            while len(record) < HEADER.size + length:
+                record += self.control.recv(HANDOFF_SIZE)
+        return decode_record(bytes(record))["games"]
+
+"""
+Answers a "list" query from the acceptor with the given game ids.
+The frame is sent in chunks of at most HANDOFF_SIZE bytes, since a
+SOCK_SEQPACKET receive drops whatever does not fit its buffer.
+"""
+def send_waiting_ids(control, game_ids):
+    frame = encode_message({"type": "games", "games": game_ids})
+    for start in range(0, len(frame), HANDOFF_SIZE):
+        control.send(frame[start:start + HANDOFF_SIZE])
+
+"""
+Decodes the single frame at the start of a control record.
+"""
+def decode_record(record):
+    length, kind = unpack_header(record[:HEADER.size])
+    return decode_payload(kind, record[HEADER.size:HEADER.size + length])
+
+"""
+Entry point of a worker process.
+Replaces the threaded server's registry with this shard's partition, then
+serves handoffs and "list" queries from the acceptor until the acceptor's
+end of the control socket closes.
+"""
+def run_worker(index, count, control, log_level, metrics_port, journal_path, timeouts):
+    setup_logging(log_level)
+    Server.games = GameRegistry(first_id=index + 1, id_step=count)  # Game threads look the registry up by name
+    Server.timeouts = timeouts
+    metrics.gauge("games_active", lambda: len(Server.games))
+    signal.signal(signal.SIGTERM, Server.shutdown)
+    if journal_path is not None:
+        Server.open_journal(f"{journal_path}.{index}")
+    if metrics_port is not None:
+        start_metrics_server(Server.HOST, metrics_port + 1 + index)
+    log.info("Shard %d of %d is ready", index, count)
+
+    while True:
+        record, fds, _, _ = socket.recv_fds(control, HANDOFF_SIZE, 1)
+        if not record:
+            break  # The acceptor has gone away
+        if not fds:
+            # The only request without a connection is a "list" query
+            send_waiting_ids(control, Server.games.waiting_ids())
+            continue
+        conn = socket.socket(fileno=fds[0])
+        reader = MessageReader(conn)
+        reader.buffer += record
+        request = reader.next_buffered()
+        metrics.inc("connections_accepted")
+        try:
+            addr = conn.getpeername()
+        except OSError:
+            conn.close()
+            continue
+        threading.Thread(target=Server.handle_request, args=(conn, addr, reader, request)).start()
+    log.info("Shard %d stopped accepting connections", index)
+
+"""
+ShardedServer class is the front acceptor.
+It starts the worker processes, accepts connections, and routes each one to
+a shard by its first request.
+"""
+class ShardedServer:
+    def __init__(self, shard_count, log_level="INFO", metrics_port=None, journal_path=None, timeouts=None):
+        self.timeouts = timeouts or Server.Timeouts()
+        self.shards = []
+        self.next_shard = itertools.count()  # Round-robin position for new games
+        context = multiprocessing.get_context("spawn")  # Workers start clean instead of forking the acceptor's threads
+        for index in range(shard_count):
+            parent, child = socket.socketpair(socket.AF_UNIX, socket.SOCK_SEQPACKET)
+            # Not daemonic, since a daemonic process may not start the bots' process pool; shutdown stops them
+            process = context.Process(target=run_worker, name=f"shard-{index}",
+                                      args=(index, shard_count, child, log_level, metrics_port, journal_path,
+                                            self.timeouts))
+            process.start()
+            child.close()
+            self.shards.append(Shard(index, process, parent))
+
+    """
+    Stops every worker, which write their queued journal records on the way
+    out. Workers are not daemonic, so the acceptor must always stop them
+    itself before it exits.
+    """
+    def stop(self):
+        for shard in self.shards:
+            shard.process.terminate()
+        for shard in self.shards:
+            shard.process.join()
+
+    """
+    SIGTERM handler: stops every worker, then exits.
+    """
+    def shutdown(self, signum, frame):
+        self.stop()
+        os._exit(0)
+
+    """
+    Returns the shard owning the given game id.
+    """
+    def shard_for_game(self, game_id):
+        return self.shards[(game_id - 1) % len(self.shards)]
+
+    """
+    Returns the shard that should serve the given first request.
+    """
+    def route(self, request):
+        if request["type"] in ("join", "resume", "watch"):
+            return self.shard_for_game(int(request["game_id"]))
+        if request["type"] == "match":
+            return self.shards[int(request["game_size"]) % len(self.shards)]  # Players of one size meet on one shard
+        return self.shards[next(self.next_shard) % len(self.shards)]
+
+    """
+    Returns the ids of the waiting games of every shard.
+    """
+    def waiting_ids(self):
+        return sorted(game_id for shard in self.shards for game_id in shard.waiting_ids())
+
+    """
+    Reads the first request of a connection and hands the connection off.
+    "list" requests are answered here, since they need every shard, and the
+    request that follows them is routed instead.
+    """
+    def handle_connection(self, conn, addr, accepted_at):
+        metrics.observe("accept", time.perf_counter() - accepted_at)
+        reader = MessageReader(conn)
+        try:
+            request = Server.recv_handshake(conn, addr, reader, self.timeouts.handshake)
+            if (request["type"] == "list"):
+                available_games = self.waiting_ids()
+                if not available_games:
+                    send_message(conn, {"type": "error", "message": "No available games at the moment."})
+                    conn.close()
+                    return
+                send_message(conn, {"type": "games", "games": available_games})
+                request = Server.recv_handshake(conn, addr, reader, self.timeouts.handshake)
+            shard = self.route(request)
+            shard.hand_off(conn, reader, request)
+            metrics.inc(f"handoffs_shard_{shard.index}")
+        except Exception as e:
+            log.info("[CLIENT CONNECTION INTERRUPTED] on address %s: %s", addr, e)
+            conn.close()
+
+    """
+    Accepts connections forever, handing each one to a handshake thread.
+    """
+    def serve_forever(self, host, port):
+        server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        server_socket.bind((host, port))
+        server_socket.listen(1024)
+        log.info("[LISTENING] sharded server with %d shards is listening on %s:%d", len(self.shards), host, port)
+
+        while True:
+            try:
+                connection, address = server_socket.accept()
+                accepted_at = time.perf_counter()
+                metrics.inc("connections_accepted")
+                threading.Thread(target=self.handle_connection, args=(connection, address, accepted_at)).start()
+            except Exception as e:
+                log.warning("Error accepting connection: %s", e)
+
+"""
+Starts shard_count worker processes and serves clients through the front acceptor.
+"""
+def start_sharded_server(host=Server.HOST, port=Server.PORT, shard_count=None, log_level="INFO", metrics_port=None,
+                         journal_path=None, timeouts=None):
+    if shard_count is None:
+        shard_count = multiprocessing.cpu_count()
+    server = ShardedServer(shard_count, log_level, metrics_port, journal_path, timeouts)
+    signal.signal(signal.SIGTERM, server.shutdown)
+    try:
+        server.serve_forever(host, port)
+    finally:
+        server.stop()
@@ -0,0 +1,209 @@
+"""
+This module simulates random Tic Tac Toe games offline, for example to
+check how balanced the game is for a number of players and a win length.
+It plays by the rules of Game.py, with no server involved: every player in
+turn takes a random free cell until someone has win_length in a row or the
+board is full.
+
+Games are simulated in batches. With NumPy installed, a batch advances all
+of its boards at once: each step places the current player's piece on every
+unfinished board and checks only the lines through the new pieces, as the
+server's Board.place does. Without NumPy the batch plays its games one by
+one on Game.Board. Batches run in a process pool and the aggregated win and
+tie counts are streamed as each batch completes.
+
+Usage:
+    python Simulation.py --players 3 --games 1000000
+prints one JSON line of running totals per finished batch.
+"""
+
+# Imports
+import argparse
+import concurrent.futures
+import json
+import multiprocessing
+import os
+import random
+import sys
+import time
+
+from Game import WIN_LENGTH, Board, turn_after, win_lines
+
+try:
+    import numpy
+except ImportError:
+    numpy = None  # Batches fall back to playing one game at a time
+
+BATCH_SIZE = 10000  # Games per batch handed to a worker process
+
+"""
+Stats class aggregates the results of simulated games.
+counts[0] is the number of ties and counts[player_id] the number of games
+won by that player.
+"""
+class Stats:
+    __slots__ = ("game_size", "win_length", "games", "counts", "moves", "started")
+
+    def __init__(self, game_size, win_length):
+        self.game_size = game_size
+        self.win_length = win_length
+        self.games = 0
+        self.counts = [0] * (game_size + 1)
+        self.moves = 0  # Moves played over all games
+        self.started = time.perf_counter()
+
+    """
+    Adds the results of one batch, as returned by simulate_batch.
+    """
+    def add(self, counts, moves):
+        for player_id, count in enumerate(counts):
+            self.counts[player_id] += count
+        self.games += sum(counts)
+        self.moves += moves
+
+    """
+    Returns the running totals as a JSON-friendly dictionary.
+    """
+    def summary(self):
+        games = self.games or 1
+        elapsed = time.perf_counter() - self.started
+        return {
+            "players": self.game_size,
+            "win_length": self.win_length,
+            "games": self.games,
+            "ties": self.counts[0],
+            "wins": {player_id: self.counts[player_id] for player_id in range(1, self.game_size + 1)},
+            "tie_rate": round(self.counts[0] / games, 4),
+            "win_rates": {player_id: round(self.counts[player_id] / games, 4)
+                          for player_id in range(1, self.game_size + 1)},
+            "mean_moves": round(self.moves / games, 2),
+            "games_per_sec": round(self.games / elapsed) if elapsed > 0 else 0,
+        }
+
+"""
+Plays one random game on a Board of the given side and returns
+(winner, moves), with winner 0 for a tie.
+A random order of all cells is drawn up front: taking the next free cell
+of a shuffled order is the same as taking a random free cell every turn.
+"""
+def play_random_game(size, game_size, win_length, rng):
+    board = Board(size, game_size, win_length)
+    cells = list(range(size * size))
+    rng.shuffle(cells)
+    for seq, cell in enumerate(cells):
+        player_id = turn_after(seq, game_size)
+        if board.place(cell // size, cell % size, player_id):
+            return player_id, seq + 1
+    return 0, len(cells)
+
+"""
+Plays a batch of games one at a time. Returns (counts, moves) like
+simulate_batch.
+"""
+def play_batch(game_size, win_length, games, seed):
+    size = game_size + 1
+    rng = random.Random(f"{seed[0]}:{seed[1]}")
+    counts = [0] * (game_size + 1)
+    moves = 0
+    for _ in range(games):
+        winner, length = play_random_game(size, game_size, win_length, rng)
+        counts[winner] += 1
+        moves += length
+    return counts, moves
+
+"""
+Plays a batch of games side by side with NumPy. Returns (counts, moves)
+like simulate_batch.
+Boards are the rows of one array, with an extra cell at the end of each row
+that always stays empty. Every step places the same player's piece on each
+unfinished board, then reads the lines through the new pieces from
+win_lines; cells with fewer lines than the most crossed one are padded with
+a line made of the empty extra cell, which never wins.
+"""
+def play_batch_numpy(game_size, win_length, games, seed):
+    size = game_size + 1
+    cell_count = size * size
+    lines = win_lines(size, win_length)
+    rng = numpy.random.default_rng(seed)
+    order = numpy.argsort(rng.random((games, cell_count)), axis=1)  # Playing order of the cells of each board
+    boards = numpy.zeros((games, cell_count + 1), dtype=numpy.uint8 if game_size < 256 else numpy.uint16)
+
+    line_cells = numpy.array(lines.lines + ((cell_count,) * win_length,), dtype=numpy.intp)
+    padding = len(lines.lines)  # Index of the line that never wins
+    width = max(len(cell_lines) for cell_lines in lines.through)
+    numbers = {line: number for number, line in enumerate(lines.lines)}
+    through = numpy.full((cell_count, width), padding, dtype=numpy.intp)
+    for cell, cell_lines in enumerate(lines.through):
+        through[cell, :len(cell_lines)] = [numbers[line] for line in cell_lines]
+
+    winners = numpy.zeros(games, dtype=numpy.intp)
+    lengths = numpy.full(games, cell_count, dtype=numpy.int64)
+    active = numpy.arange(games)  # Boards whose game is still going
+    for seq in range(cell_count):
+        if not active.size:
+            break
+        player_id = turn_after(seq, game_size)
+        moves = order[active, seq]
+        boards[active, moves] = player_id
+        cells = line_cells[through[moves]]  # (boards, lines through the move, cells of the line)
+        won = (boards[active[:, None, None], cells] == player_id).all(axis=2).any(axis=1)
+        finished = active[won]
+        winners[finished] = player_id
+        lengths[finished] = seq + 1
+        active = active[~won]
+    counts = numpy.bincount(winners, minlength=game_size + 1)
+    return [int(count) for count in counts], int(lengths.sum())
+
+"""
+Process pool entry point: plays `games` random games for game_size players
+and returns (counts, moves): counts[0] ties, counts[player_id] wins, and the
+moves played over all games. seed is a (run seed, batch index) pair, so
+every batch of a run plays different games and a run can be repeated.
+"""
+def simulate_batch(game_size, win_length, games, seed):
+    if numpy is not None:
+        return play_batch_numpy(game_size, win_length, games, seed)
+    return play_batch(game_size, win_length, games, seed)
+
+"""
+Simulates `games` random games in batches of batch_size on `processes`
+worker processes, one process per core if None, or in this process if 1.
+Yields the running Stats after each finished batch, so long runs report as
+they go; batches are added in the order they finish.
+"""
+def simulate(game_size, win_length=WIN_LENGTH, games=BATCH_SIZE, batch_size=BATCH_SIZE, processes=None, seed=0):
+    stats = Stats(game_size, win_length)
+    batches = [min(batch_size, games - start) for start in range(0, games, batch_size)]
+    if processes == 1:
+        for index, count in enumerate(batches):
+            stats.add(*simulate_batch(game_size, win_length, count, (seed, index)))
+            yield stats
+        return
+    # Spawned workers start clean, like the bots' search pool in Engine.py
+    with concurrent.futures.ProcessPoolExecutor(processes or os.cpu_count() or 1,
+                                                mp_context=multiprocessing.get_context("spawn")) as pool:
+        futures = [pool.submit(simulate_batch, game_size, win_length, count, (seed, index))
+                   for index, count in enumerate(batches)]
+        for future in concurrent.futures.as_completed(futures):
+            stats.add(*future.result())
+            yield stats
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulate random Tic Tac Toe games and report win and tie rates")
+    parser.add_argument("--players", type=int, default=2, help="number of players, the board is (players + 1)^2")
+    parser.add_argument("--win-length", type=int, default=WIN_LENGTH, help="pieces in a row that win a game")
+    parser.add_argument("--games", type=int, default=100000, help="number of games to simulate")
+    parser.add_argument("--batch", type=int, default=BATCH_SIZE, help="games per batch")
+    parser.add_argument("--processes", type=int, help="worker processes, one per core by default")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the random moves")
+    args = parser.parse_args()
+    if args.players < 2:
+        parser.error("--players must be at least 2")
+    if not 2 <= args.win_length <= args.players + 1:
+        parser.error("--win-length must be between 2 and the board side")
+
+    for stats in simulate(args.players, args.win_length, args.games, args.batch, args.processes, args.seed):
+        print(json.dumps(stats.summary()), flush=True)
+
+if __name__ == "__main__":
+    sys.exit(main())
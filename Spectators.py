@@ -0,0 +1,303 @@
+"""
+This module serves the spectators of running games.
+A spectator connection is read-only: after its "watch" request it gets a
+snapshot of the board, then the same deltas and game_over message as the
+players. Spectators never go through a game's own send path. The game only
+hands each move to a Feed, which encodes the delta once; every spectator is
+then given the same bytes.
+
+A spectator that is still sending earlier frames when a move is played
+skips it. Once its queue has drained it gets one snapshot of the latest
+board, so a slow spectator only ever has one frame's worth of catching up
+to do, however many moves it missed.
+
+SpectatorHub serves the spectators of the threaded server from one thread
+per process. Game threads only append the move to the hub's queue, so a
+game plays at the same speed whether it has no spectators or thousands.
+"""
+
+# Imports
+import selectors
+import socket
+import threading
+import time
+
+from Game import Board
+from Log import get_logger
+from Metrics import metrics
+from Protocol import CLOSE_FLUSH_TIMEOUT, RECV_SIZE, MessageWriter, encode_message
+
+log = get_logger("spectators")
+
+"""
+Feed class follows the board of one game for its spectators.
+It keeps its own copy of the board, so snapshots are rendered without
+touching the game's state. It must be created from a consistent view of
+the game: the game's state lock is held for GameThread.
+"""
+class Feed:
+    __slots__ = ("game_id", "board", "symbols", "seq", "turn", "delta", "snapshot", "spectators")
+
+    def __init__(self, game):
+        self.game_id = game.game_id
+        board = game.board
+        self.board = Board(board.size, len(game.symbols) - 1, board.win_length)
+        self.board.cells[:] = board.cells
+        self.symbols = list(game.symbols)
+        self.seq = game.seq
+        self.turn = game.turn
+        self.delta = None  # Frame of the last move, shared by every spectator
+        self.snapshot = None  # (seq, frame) of the last snapshot rendered
+        self.spectators = set()
+
+    """
+    Applies a move and returns the delta frame describing it.
+    """
+    def apply(self, row, col, player_id, seq, turn):
+        self.board.cells[row * self.board.size + col] = player_id
+        self.seq = seq
+        self.turn = turn
+        self.delta = encode_message({"type": "delta", "row": row, "col": col, "symbol": self.symbols[player_id],
+                                     "seq": seq, "turn": turn})
+        return self.delta
+
+    """
+    Returns the snapshot frame of the current board.
+    It is rendered at most once per move, however many spectators need it.
+    """
+    def snapshot_frame(self):
+        if self.snapshot is None or self.snapshot[0] != self.seq:
+            message = {"type": "board", "board": self.board.render(self.symbols), "seq": self.seq, "turn": self.turn}
+            self.snapshot = (self.seq, encode_message(message))
+        return self.snapshot[1]
+
+"""
+Spectator class is one watching connection of the threaded server.
+"""
+class Spectator:
+    __slots__ = ("conn", "writer", "feed", "stale")
+
+    def __init__(self, conn, feed):
+        self.conn = conn
+        self.writer = MessageWriter(conn)  # Makes the connection non-blocking
+        self.feed = feed
+        self.stale = False  # Whether it skipped a move and needs a snapshot once its queue drains
+
+"""
+SpectatorHub class runs the spectators of every game of a threaded server
+on one thread with its own selector. Other threads talk to it through
+post(), which queues an event and wakes the hub up; only the hub thread
+touches the feeds and the spectator connections. The thread is started by
+the first event.
+"""
+class SpectatorHub:
+    def __init__(self):
+        self.lock = threading.Lock()  # Guards events, signalled and thread
+        self.events = []  # Events posted since the hub last looked
+        self.signalled = False  # Whether the hub has been woken up for the queued events
+        self.thread = None
+        self.selector = None
+        self.waker = None  # Socket pair that wakes the hub when an event is posted
+        self.feeds = {}  # game_id -> Feed of the watched games
+        self.closing = {}  # Spectator -> monotonic deadline, for spectators of finished games
+        self.count = 0  # Spectators connected
+
+    """
+    Queues an event for the hub thread and wakes it up if it is not
+    awake already, so a burst of moves costs at most one wake-up.
+    """
+    def post(self, event):
+        with self.lock:
+            self.events.append(event)
+            if self.thread is None:
+                self.selector = selectors.DefaultSelector()
+                self.waker = socket.socketpair()
+                self.waker[0].setblocking(False)
+                self.selector.register(self.waker[0], selectors.EVENT_READ, None)
+                self.thread = threading.Thread(target=self.run, name="spectators", daemon=True)
+                self.thread.start()
+                metrics.gauge("spectators", lambda: self.count)
+            if self.signalled:
+                return
+            self.signalled = True
+        self.waker[1].send(b"\0")
+
+    """
+    Adds a spectator to a game. Called from the connection's own thread.
+    Returns False if the game is already over.
+    """
+    def watch(self, game, conn):
+        with game.state_lock:
+            if game.game_over:
+                return False
+            if not game.watched:
+                game.watched = True  # The game thread posts its moves from now on
+                self.post(("open", Feed(game)))
+            self.post(("watch", game.game_id, conn))
+        return True
+
+    """
+    Hands a move to the spectators. Called by the game thread right after
+    the move was played, once the players have been sent it. The state lock
+    is not needed: only the game thread changes the board, seq and turn read
+    here, and events reach the hub in the order they were posted, so a
+    spectator that started watching meanwhile gets the move after its
+    snapshot.
+    """
+    def moved(self, game, row, col):
+        self.post(("move", game.game_id, row, col, game.board.get(row, col), game.seq, game.turn))
+
+    """
+    Sends the spectators of a finished game its game_over message and
+    closes their connections.
+    """
+    def finish(self, game, message):
+        self.post(("over", game.game_id, message))
+
+    """
+    Hub thread: serves the spectator connections and the posted events.
+    """
+    def run(self):
+        while True:
+            timeout = max(0.0, min(self.closing.values()) - time.monotonic()) if self.closing else None
+            for key, mask in self.selector.select(timeout):
+                if key.data is None:
+                    try:
+                        while key.fileobj.recv(RECV_SIZE):
+                            pass
+                    except BlockingIOError:
+                        pass
+                    continue
+                spectator = key.data
+                if mask & selectors.EVENT_READ:
+                    self.read(spectator)
+                if mask & selectors.EVENT_WRITE and spectator.conn is not None:
+                    self.flush(spectator)
+
+            with self.lock:
+                events, self.events = self.events, []
+                self.signalled = False
+            for event in events:
+                if event[0] == "move":
+                    self.fan_out(*event[1:])
+                elif event[0] == "watch":
+                    self.add(*event[1:])
+                elif event[0] == "open":
+                    self.feeds[event[1].game_id] = event[1]
+                else:
+                    self.close_feed(*event[1:])
+
+            now = time.monotonic()
+            for spectator, deadline in list(self.closing.items()):
+                if deadline <= now:
+                    self.drop(spectator)
+
+    """
+    Sends a move to every spectator of its game that is up to date, and
+    marks the others as stale instead of queueing more frames for them.
+    """
+    def fan_out(self, game_id, row, col, player_id, seq, turn):
+        feed = self.feeds.get(game_id)
+        if feed is None:
+            return
+        with metrics.timer("spectator_broadcast"):
+            frame = feed.apply(row, col, player_id, seq, turn)
+            for spectator in list(feed.spectators):
+                if spectator.stale or spectator.writer.chunks:
+                    spectator.stale = True  # Gets a snapshot once its queue drains
+                    metrics.inc("spectator_updates_coalesced")
+                else:
+                    self.send(spectator, frame)
+
+    """
+    Seats a new spectator and sends it the current board.
+    """
+    def add(self, game_id, conn):
+        feed = self.feeds.get(game_id)
+        if feed is None:
+            conn.close()  # Cannot happen: a game's feed only closes after its last watch event
+            return
+        spectator = Spectator(conn, feed)
+        feed.spectators.add(spectator)
+        self.selector.register(conn, selectors.EVENT_READ, spectator)
+        self.count += 1
+        log.debug("Spectator joined game %d, %d watching", game_id, len(feed.spectators))
+        self.send(spectator, feed.snapshot_frame())
+
+    """
+    Sends the last messages of a finished game to its spectators and closes
+    them once those are sent, or after CLOSE_FLUSH_TIMEOUT seconds.
+    """
+    def close_feed(self, game_id, message):
+        feed = self.feeds.pop(game_id, None)
+        if feed is None:
+            return
+        frame = encode_message(message)
+        deadline = time.monotonic() + CLOSE_FLUSH_TIMEOUT
+        for spectator in list(feed.spectators):
+            if spectator.stale:
+                spectator.stale = False
+                self.send(spectator, feed.snapshot_frame())
+            self.send(spectator, frame)
+            if spectator.conn is None:
+                continue  # Dropped by send
+            if spectator.writer.chunks:
+                self.closing[spectator] = deadline
+            else:
+                self.drop(spectator)
+
+    """
+    Queues a frame for a spectator. A spectator whose connection is broken,
+    or whose queue is full, is dropped.
+    """
+    def send(self, spectator, data):
+        if not spectator.writer.write(data):
+            self.drop(spectator)
+        elif spectator.writer.chunks:
+            self.selector.modify(spectator.conn, selectors.EVENT_READ | selectors.EVENT_WRITE, spectator)
+
+    """
+    Sends more of a spectator's queue. Once it has drained, a spectator of
+    a finished game is closed, and a stale one gets the latest snapshot.
+    """
+    def flush(self, spectator):
+        try:
+            done = spectator.writer.flush()
+        except OSError:
+            self.drop(spectator)
+            return
+        if not done:
+            return
+        self.selector.modify(spectator.conn, selectors.EVENT_READ, spectator)
+        if spectator in self.closing:
+            self.drop(spectator)
+        elif spectator.stale:
+            spectator.stale = False
+            self.send(spectator, spectator.feed.snapshot_frame())
+
+    """
+    Reads from a spectator's connection only to notice it closing.
+    Spectators have nothing to say, so whatever they send is ignored.
+    """
+    def read(self, spectator):
+        try:
+            data = spectator.conn.recv(RECV_SIZE)
+        except (BlockingIOError, InterruptedError):
+            return
+        except OSError:
+            data = b""
+        if not data:
+            self.drop(spectator)
+
+    """
+    Closes a spectator's connection and forgets it.
+    """
+    def drop(self, spectator):
+        if spectator.conn is None:
+            return
+        spectator.feed.spectators.discard(spectator)
+        self.closing.pop(spectator, None)
+        self.selector.unregister(spectator.conn)
+        spectator.conn.close()
+        spectator.conn = None
+        self.count -= 1
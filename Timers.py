@@ -0,0 +1,121 @@
+"""
+This module runs the deadlines of the threaded server on a timer wheel.
+A hashed timer wheel keeps its timers in a ring of slots, one slot per
+tick: scheduling or cancelling a timer costs O(1), and each tick only looks
+at the timers of one slot. One thread per process turns the wheel and runs
+the callbacks of the timers that are due, so a connection or a game waiting
+for a deadline costs a list entry instead of a thread blocked in recv or
+waking up to poll.
+
+Callbacks run on the wheel's thread and must not block: they close a
+socket, or flag a game and wake its own thread up.
+"""
+
+# Imports
+import math
+import threading
+import time
+
+from Log import get_logger
+from Metrics import metrics
+
+TICK = 0.1  # Seconds per tick, the resolution of every deadline
+SLOTS = 512  # Slots of the wheel; a timer further out than SLOTS ticks waits for several turns
+PENDING, CANCELLED, FIRED = 0, 1, 2  # States of a timer
+
+log = get_logger("timers")
+
+"""
+Timer class is one scheduled callback, returned by TimerWheel.schedule.
+"""
+class Timer:
+    __slots__ = ("wheel", "tick", "callback", "state")
+
+    def __init__(self, wheel, tick, callback):
+        self.wheel = wheel
+        self.tick = tick  # Tick the timer is due at
+        self.callback = callback
+        self.state = PENDING
+
+    """
+    Cancels the timer. Returns False if it is too late: the callback has run
+    or is running.
+    A cancelled timer stays in its slot until the wheel next passes it.
+    """
+    def cancel(self):
+        with self.wheel.lock:
+            if self.state == FIRED:
+                return False
+            if self.state == PENDING:
+                self.state = CANCELLED
+                self.wheel.pending -= 1
+            return True
+
+"""
+TimerWheel class schedules callbacks to run after a delay, rounded up to
+the next tick. The thread is started by the first timer and sleeps for as
+long as no timer is pending.
+"""
+class TimerWheel:
+    def __init__(self, tick=TICK, slots=SLOTS):
+        self.tick = tick
+        self.slots = [[] for _ in range(slots)]
+        self.lock = threading.Condition()  # Guards the slots, current and pending
+        self.origin = None  # Monotonic time of tick 0
+        self.current = 0  # Next tick to run
+        self.pending = 0  # Timers neither fired nor cancelled
+        self.thread = None
+
+    """
+    Runs callback on the wheel's thread once delay seconds have passed.
+    Returns the Timer, which can be cancelled until then.
+    """
+    def schedule(self, delay, callback):
+        with self.lock:
+            if self.thread is None:
+                self.origin = time.monotonic()
+                self.thread = threading.Thread(target=self.run, name="timers", daemon=True)
+                self.thread.start()
+                metrics.gauge("timers_pending", lambda: self.pending)
+            tick = max(self.current, math.ceil((time.monotonic() + delay - self.origin) / self.tick))
+            timer = Timer(self, tick, callback)
+            self.slots[tick % len(self.slots)].append(timer)
+            self.pending += 1
+            if self.pending == 1:
+                self.lock.notify()  # The wheel sleeps while nothing is pending
+            return timer
+
+    """
+    Wheel thread: on every tick, fires the due timers of the tick's slot and
+    drops the cancelled ones. After sleeping through several ticks it catches
+    up on every slot it missed, once at most.
+    """
+    def run(self):
+        while True:
+            due = []
+            with self.lock:
+                while not self.pending:
+                    self.lock.wait()
+                now = math.floor((time.monotonic() - self.origin) / self.tick)  # Last tick that has begun
+                if now < self.current:
+                    self.lock.wait(self.origin + self.current * self.tick - time.monotonic())
+                    continue
+                for tick in range(self.current, min(now, self.current + len(self.slots) - 1) + 1):
+                    slot = self.slots[tick % len(self.slots)]
+                    kept = []
+                    for timer in slot:
+                        if timer.state != PENDING:
+                            continue
+                        if timer.tick <= now:
+                            timer.state = FIRED
+                            self.pending -= 1
+                            due.append(timer)
+                        else:
+                            kept.append(timer)  # Due on a later turn of the wheel
+                    slot[:] = kept
+                self.current = now + 1
+            for timer in due:
+                try:
+                    timer.callback()
+                except Exception:
+                    log.exception("Timer callback failed")
@@ -0,0 +1,58 @@
+"""
+Benchmark comparing the full-board win scan with the incremental check
+done by Board.place, which the turn loop uses.
+Plays the same sequence of non-winning moves on boards of growing size and
+reports the average cost of one win check per move for both methods.
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from Game import Board
+
+SIZES = [3, 5, 9, 17, 33, 65]  # Board side lengths, i.e. game_size + 1
+REPEATS = 3  # Each measurement is repeated and the best run is kept
+
+"""
+Returns the moves used by the benchmark: every cell whose row and column are
+both multiples of 3, alternating between two players. No two of these cells
+touch, so nobody ever wins and both checks do their worst-case work.
+"""
+def isolated_moves(size):
+    cells = [(row, col) for row in range(0, size, 3) for col in range(0, size, 3)]
+    return [(row, col, 1 + i % 2) for i, (row, col) in enumerate(cells)]
+
+"""
+Plays all moves on a fresh board and returns the seconds spent in the win check.
+The full scan writes the cell directly and then calls Board.winner; the
+incremental check is the run bookkeeping done by Board.place.
+"""
+def time_checks(size, moves, incremental):
+    board = Board(size)
+    elapsed = 0.0
+    for row, col, player_id in moves:
+        if incremental:
+            start = time.perf_counter()
+            board.place(row, col, player_id)
+        else:
+            board.cells[row * size + col] = player_id
+            start = time.perf_counter()
+            board.winner()
+        elapsed += time.perf_counter() - start
+    return elapsed
+
+def main():
+    print(f"{'board':>7} {'moves':>6} {'full scan us/move':>19} {'incremental us/move':>21} {'speedup':>8}")
+    for size in SIZES:
+        moves = isolated_moves(size)
+        full = min(time_checks(size, moves, False) for _ in range(REPEATS))
+        incremental = min(time_checks(size, moves, True) for _ in range(REPEATS))
+        full_us = full / len(moves) * 1e6
+        incremental_us = incremental / len(moves) * 1e6
+        print(f"{size:>3}x{size:<3} {len(moves):>6} {full_us:>19.2f} {incremental_us:>21.2f} {full / incremental:>7.1f}x")
+
+if __name__ == "__main__":
+    main()
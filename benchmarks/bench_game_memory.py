@@ -0,0 +1,51 @@
+"""
+Benchmark measuring the memory footprint of concurrent games.
+Creates many GameThread instances (without starting their threads) and
+reports the memory allocated per game, next to the footprint of the board
+alone and of the list-of-lists board the games used to keep.
+"""
+
+import argparse
+import os
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from Game import Board
+from Server import GameThread
+
+"""
+Returns the bytes allocated per object while building count objects with factory.
+"""
+def bytes_per_object(factory, count):
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    objects = [factory(i) for i in range(count)]
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del objects
+    return (after - before) / count
+
+"""
+Builds a board the way games used to: a list of lists of one-character strings.
+"""
+def list_board(size):
+    return [[" " for _ in range(size)] for _ in range(size)]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--games", type=int, default=10000, help="number of concurrent games")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[2, 4, 8, 16], help="numbers of players per game")
+    args = parser.parse_args()
+
+    print(f"{args.games} concurrent games")
+    print(f"{'players':>7} {'game bytes':>11} {'board bytes':>12} {'list board bytes':>17}")
+    for game_size in args.sizes:
+        game = bytes_per_object(lambda i: GameThread(i, None, None, None, game_size), args.games)
+        board = bytes_per_object(lambda i: Board(game_size + 1, game_size), args.games)
+        legacy = bytes_per_object(lambda i: list_board(game_size + 1), args.games)
+        print(f"{game_size:>7} {game:>11.0f} {board:>12.0f} {legacy:>17.0f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,230 @@
+"""
+Load benchmark driving a server process with thousands of bot clients.
+Starts Server.py on a free local port, seats game_size bots in each of many
+concurrent games, then lets every bot play random legal moves until its game
+is over. Reports joins/sec, moves/sec and the p50/p99 move round-trip latency.
+Results can be saved as a named baseline and later runs compared against it.
+With --shards the sharded server is measured; --processes spreads the bots
+over several client processes so the bots themselves do not cap the load.
+With --binary the bots use the binary wire encoding instead of JSON.
+"""
+
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import platform
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+
+from BotClient import Bot
+from bench_time_to_start import HOST, free_port
+
+BASELINES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines", "load.json")
+HIGHER_IS_BETTER = {"joins_per_sec": True, "moves_per_sec": True, "p50_ms": False, "p99_ms": False}
+
+"""
+Starts Server.py in its own process and waits until it accepts connections.
+Returns the process handle.
+"""
+def start_server_process(port, use_async, shards=None):
+    command = [sys.executable, os.path.join(ROOT, "Server.py"), "--host", HOST, "--port", str(port)]
+    if use_async:
+        command.append("--async")
+    if shards is not None:
+        command += ["--shards", str(shards)]
+    process = subprocess.Popen(command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.monotonic() + 10
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection((HOST, port)).close()
+            return process
+        except OSError:
+            time.sleep(0.05)
+    process.kill()
+    sys.exit("The server did not start listening in time")
+
+"""
+Raises the open file limit as far as allowed, since every bot holds a socket.
+"""
+def raise_file_limit():
+    try:
+        import resource
+    except ImportError:
+        return  # Not available on Windows
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft < hard:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+
+"""
+Returns the p-th percentile of the sorted samples.
+"""
+def percentile(samples, p):
+    return samples[min(len(samples) - 1, int(len(samples) * p / 100))]
+
+"""
+Seats all bots, then plays all games, and returns the raw measurements.
+At most `concurrency` seat requests are in flight at once, so the bots do not
+overflow the server's listen backlog.
+"""
+async def run_load(port, games, game_size, concurrency, seed, binary=False):
+    rng = random.Random(seed)
+    limit = asyncio.Semaphore(concurrency)
+    tables = [[Bot(HOST, port, rng, binary) for _ in range(game_size)] for _ in range(games)]
+
+    async def seat(bot, request):
+        async with limit:
+            await request(bot)
+
+    async def seat_table(bots):
+        await seat(bots[0], lambda bot: bot.create(game_size))
+        await asyncio.gather(*(seat(bot, lambda bot: bot.join(bots[0].game_id)) for bot in bots[1:]))
+
+    start = time.perf_counter()
+    await asyncio.gather(*(seat_table(bots) for bots in tables))
+    seated = time.perf_counter()
+    bots = [bot for table in tables for bot in table]
+    await asyncio.gather(*(bot.play() for bot in bots))
+    finished = time.perf_counter()
+    for bot in bots:
+        bot.close()
+
+    return {
+        "seats": len(bots),
+        "seat_seconds": seated - start,
+        "moves": sum(bot.moves for bot in bots),
+        "play_seconds": finished - seated,
+        "latencies_ms": [latency * 1000 for bot in bots for latency in bot.latencies],
+    }
+
+"""
+Runs one client process's share of the load. Used as the process pool target.
+"""
+def run_client_process(arguments):
+    raise_file_limit()
+    return asyncio.run(run_load(*arguments))
+
+"""
+Plays the load from `processes` client processes at once and returns the
+measured results. Rates of the processes add up, and their latencies are
+merged before taking percentiles.
+"""
+def measure(port, games, game_size, concurrency, seed, processes, binary=False):
+    shares = [(port, games // processes + (i < games % processes), game_size,
+               max(1, concurrency // processes), seed + i, binary) for i in range(processes)]
+    if processes == 1:
+        parts = [asyncio.run(run_load(*shares[0]))]
+    else:
+        with multiprocessing.get_context("spawn").Pool(processes) as pool:
+            parts = pool.map(run_client_process, shares)
+    latencies = sorted(latency for part in parts for latency in part["latencies_ms"])
+    return {
+        "joins_per_sec": sum(part["seats"] / part["seat_seconds"] for part in parts),
+        "moves_per_sec": sum(part["moves"] / part["play_seconds"] for part in parts),
+        "p50_ms": percentile(latencies, 50),
+        "p99_ms": percentile(latencies, 99),
+        "mean_ms": statistics.mean(latencies),
+        "moves": sum(part["moves"] for part in parts),
+    }
+
+"""
+Loads the saved baselines, keyed by baseline name.
+"""
+def load_baselines():
+    if not os.path.exists(BASELINES):
+        return {}
+    with open(BASELINES) as f:
+        return json.load(f)
+
+"""
+Stores results under the given baseline name, next to the run settings.
+"""
+def save_baseline(name, results, settings):
+    baselines = load_baselines()
+    baselines[name] = {"settings": settings, "results": results,
+                       "python": platform.python_version(), "machine": platform.machine()}
+    os.makedirs(os.path.dirname(BASELINES), exist_ok=True)
+    with open(BASELINES, "w") as f:
+        json.dump(baselines, f, indent=2, sort_keys=True)
+        f.write("\n")
+
+"""
+Prints every metric next to its baseline value.
+Returns the names of the metrics that got worse by more than tolerance percent.
+"""
+def compare(results, baseline, tolerance):
+    regressions = []
+    print(f"{'metric':>14} {'baseline':>10} {'current':>10} {'change':>8}")
+    for metric, higher_is_better in HIGHER_IS_BETTER.items():
+        before, after = baseline["results"][metric], results[metric]
+        change = (after - before) / before * 100 if before else 0.0
+        worse = -change if higher_is_better else change
+        flag = "  REGRESSION" if worse > tolerance else ""
+        if flag:
+            regressions.append(metric)
+        print(f"{metric:>14} {before:>10.2f} {after:>10.2f} {change:>+7.1f}%{flag}")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--async", dest="use_async", action="store_true", help="benchmark the asyncio server")
+    parser.add_argument("--games", type=int, default=1000, help="number of concurrent games")
+    parser.add_argument("--size", type=int, default=2, help="number of players per game")
+    parser.add_argument("--concurrency", type=int, default=100, help="seat requests in flight at once")
+    parser.add_argument("--seed", type=int, default=0, help="seed for the bots' random moves")
+    parser.add_argument("--shards", type=int, metavar="N", help="benchmark the sharded server with N worker processes")
+    parser.add_argument("--processes", type=int, default=1, help="number of client processes running the bots")
+    parser.add_argument("--binary", action="store_true", help="let the bots use the binary wire encoding")
+    parser.add_argument("--runs", type=int, default=1, help="repeat the run and report the median of each metric")
+    parser.add_argument("--save", metavar="NAME", help="save the results as the named baseline")
+    parser.add_argument("--baseline", metavar="NAME", help="compare the results with the named baseline")
+    parser.add_argument("--tolerance", type=float, default=10.0,
+                        help="percent a metric may get worse before it counts as a regression")
+    args = parser.parse_args()
+
+    baseline = None
+    if args.baseline:
+        baseline = load_baselines().get(args.baseline)
+        if baseline is None:
+            sys.exit(f"No baseline named {args.baseline!r} in {BASELINES}")
+
+    raise_file_limit()
+    runs = []
+    for _ in range(args.runs):  # A fresh server per run, so runs do not share state
+        port = free_port()
+        server = start_server_process(port, args.use_async, args.shards)
+        try:
+            runs.append(measure(port, args.games, args.size, args.concurrency, args.seed, args.processes, args.binary))
+        finally:
+            server.kill()
+            server.wait()
+    results = {metric: statistics.median(run[metric] for run in runs) for metric in runs[0]}
+
+    server_name = f"sharded ({args.shards} shards)" if args.shards else "asyncio" if args.use_async else "threaded"
+    print(f"{args.games} games of {args.size} players on the {server_name} server, "
+          f"{args.processes} client process(es), {'binary' if args.binary else 'JSON'} encoding, "
+          f"median of {args.runs} run(s)")
+    print(f"joins/sec {results['joins_per_sec']:.0f}  moves/sec {results['moves_per_sec']:.0f}  "
+          f"p50 {results['p50_ms']:.2f} ms  p99 {results['p99_ms']:.2f} ms  ({results['moves']:.0f} moves)")
+
+    settings = {"async": args.use_async, "games": args.games, "size": args.size, "concurrency": args.concurrency,
+                "runs": args.runs, "shards": args.shards, "processes": args.processes, "binary": args.binary}
+    if args.save:
+        save_baseline(args.save, results, settings)
+        print(f"Saved baseline {args.save!r}")
+    if baseline is not None:
+        if {"shards": None, "processes": 1, "binary": False, **baseline["settings"], "runs": args.runs} != settings:
+            print(f"Warning: baseline {args.baseline!r} was recorded with {baseline['settings']}")
+        if compare(results, baseline, args.tolerance):
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
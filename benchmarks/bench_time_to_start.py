@@ -0,0 +1,115 @@
+"""
+Benchmark measuring how long a full game takes to start.
+Starts a server on a free local port, then repeatedly creates a game and
+fills it with players. The time to start is measured from the moment the
+last player sends its join request until every player has received the
+first board.
+"""
+
+import argparse
+import asyncio
+import os
+import socket
+import statistics
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from Log import setup_logging
+from Protocol import MessageReader, send_message
+
+HOST = '127.0.0.1'
+
+"""
+Returns a TCP port that is currently free on the loopback interface.
+"""
+def free_port():
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind((HOST, 0))
+        return sock.getsockname()[1]
+
+"""
+Starts the threaded or the asyncio server in a daemon thread and waits
+until it accepts connections.
+"""
+def start_background_server(port, use_async):
+    if use_async:
+        from AsyncServer import start_async_server
+        target = lambda: asyncio.run(start_async_server(HOST, port))
+    else:
+        from Server import start_server
+        target = lambda: start_server(HOST, port)
+    threading.Thread(target=target, daemon=True).start()
+    while True:
+        try:
+            socket.create_connection((HOST, port)).close()
+            return
+        except OSError:
+            time.sleep(0.05)
+
+"""
+Opens a connection and sends the first request on it.
+Returns the socket and its message reader.
+"""
+def connect(port, request):
+    sock = socket.create_connection((HOST, port))
+    reader = MessageReader(sock)
+    send_message(sock, request)
+    return sock, reader
+
+"""
+Waits until a message of the given type arrives on the reader.
+"""
+def wait_for(reader, message_type):
+    while True:
+        message = reader.recv_message()
+        if message["type"] == message_type:
+            return message
+
+"""
+Creates one game of game_size players and returns its time to start in seconds.
+"""
+def time_to_start(port, game_size):
+    sockets = []
+    creator, creator_reader = connect(port, {"type": "create", "game_size": game_size})
+    sockets.append(creator)
+    game_id = wait_for(creator_reader, "player_id")["game_id"]
+    readers = [creator_reader]
+    for _ in range(game_size - 2):
+        sock, reader = connect(port, {"type": "join", "game_id": game_id})
+        wait_for(reader, "player_id")
+        sockets.append(sock)
+        readers.append(reader)
+    sock = socket.create_connection((HOST, port))
+    reader = MessageReader(sock)
+    sockets.append(sock)
+    readers.append(reader)
+    start = time.perf_counter()
+    send_message(sock, {"type": "join", "game_id": game_id})
+    for reader in readers:
+        wait_for(reader, "board")
+    elapsed = time.perf_counter() - start
+    for sock in sockets:
+        sock.close()
+    return elapsed
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--async", dest="use_async", action="store_true", help="benchmark the asyncio server")
+    parser.add_argument("--games", type=int, default=20, help="games created per game size")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[2, 4, 8], help="numbers of players per game")
+    args = parser.parse_args()
+
+    setup_logging("ERROR")  # Closing the benchmark connections is expected, so skip the warnings
+    port = free_port()
+    start_background_server(port, args.use_async)
+    print(f"{'players':>7} {'games':>6} {'mean ms':>9} {'p50 ms':>9} {'max ms':>9}")
+    for game_size in args.sizes:
+        samples = [time_to_start(port, game_size) * 1000 for _ in range(args.games)]
+        print(f"{game_size:>7} {len(samples):>6} {statistics.mean(samples):>9.2f} "
+              f"{statistics.median(samples):>9.2f} {max(samples):>9.2f}")
+
+if __name__ == "__main__":
+    main()
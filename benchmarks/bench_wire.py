@@ -0,0 +1,65 @@
+"""
+Benchmark comparing the JSON and the binary wire encoding.
+For boards of growing size, reports the bytes on the wire for one move and
+the update it causes (a delta, or a full board snapshot for players without
+deltas), and the CPU time to encode and decode them, per move.
+"""
+
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from Game import GameState
+from Protocol import HEADER, decode_payload, encode_message
+
+SIZES = [3, 5, 9, 17, 33, 65]  # Board side lengths, i.e. game_size + 1
+REPEATS = 3  # Each measurement is repeated and the best run is kept
+
+"""
+Returns the messages of one move on a half-full board of the given side:
+the move sent by the player, the delta and the board snapshot sent back.
+"""
+def move_messages(size):
+    game = GameState(1, None, None, None)
+    game.new_board(size - 1)
+    rng = random.Random(0)
+    cells = rng.sample(range(size * size), size * size // 2)
+    for index, cell in enumerate(cells):
+        game.turn = index % game.game_size + 1
+        game.play_move(*divmod(cell, size))
+    row, col = divmod(cells[-1], size)
+    return [{"type": "move", "row": row, "col": col}, game.delta_message(row, col), game.snapshot_message()]
+
+"""
+Returns the best time in microseconds to encode a message and decode the frame.
+"""
+def round_trip_us(message, binary):
+    runs = max(1, 20000 // len(encode_message(message, binary)))
+    best = None
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        for _ in range(runs):
+            frame = encode_message(message, binary)
+            decode_payload(HEADER.unpack_from(frame)[1], frame[HEADER.size:])
+        elapsed = (time.perf_counter() - start) / runs * 1e6
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+def main():
+    print(f"{'board':>7} {'encoding':>8} {'move+delta B':>13} {'move+delta us':>14} {'move+board B':>13} {'move+board us':>14}")
+    for size in SIZES:
+        move, delta, board = move_messages(size)
+        for binary in (False, True):
+            sizes = {name: len(encode_message(message, binary)) for name, message in
+                     (("move", move), ("delta", delta), ("board", board))}
+            times = {name: round_trip_us(message, binary) for name, message in
+                     (("move", move), ("delta", delta), ("board", board))}
+            print(f"{size:>3}x{size:<3} {'binary' if binary else 'JSON':>8} "
+                  f"{sizes['move'] + sizes['delta']:>13} {times['move'] + times['delta']:>14.2f} "
+                  f"{sizes['move'] + sizes['board']:>13} {times['move'] + times['board']:>14.2f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""
+Tests of the bots' search engine.
+"""
+
+import os
+import random
+import sys
+import time
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import Engine
+from Engine import MOVE_BUDGET, line_owner, search_move
+from Game import win_lines
+
+MARGIN = 0.25  # Seconds a search may overrun its budget by, for setup noise on a loaded machine
+
+"""
+Returns a board of the given side with `pieces` pieces of two players on
+random cells, none of them giving a player win_length - 2 pieces in a line,
+so no forced result cuts the search short.
+"""
+def quiet_board(size, win_length, pieces, seed):
+    lines = win_lines(size, win_length)
+    cells = [0] * (size * size)
+    order = list(range(size * size))
+    random.Random(seed).shuffle(order)
+    placed = 0
+    for cell in order:
+        if placed == pieces:
+            break
+        cells[cell] = placed % 2 + 1
+        if any(line_owner(cells, line)[1] >= max(2, win_length - 2) for line in lines.through[cell]):
+            cells[cell] = 0
+            continue
+        placed += 1
+    return cells
+
+class SearchMoveTest(unittest.TestCase):
+    def setUp(self):
+        Engine.engine = None  # Every search starts with a fresh engine, as in a new worker
+
+    def assert_within_budget(self, size, win_length, pieces):
+        cells = quiet_board(size, win_length, pieces, seed=size * win_length)
+        start = time.perf_counter()
+        row, col = search_move(cells, size, win_length, 1, 2)
+        elapsed = time.perf_counter() - start
+        self.assertEqual(cells[row * size + col], 0)
+        self.assertLess(elapsed, MOVE_BUDGET + MARGIN)
+
+    def test_large_crowded_board_stays_within_budget(self):
+        self.assert_within_budget(65, 5, 65 * 65 // 2)
+
+    def test_large_sparse_board_stays_within_budget(self):
+        self.assert_within_budget(65, 3, 65 * 65 // 10)
+
+    def test_blocks_a_win(self):
+        self.assertEqual(search_move([1, 1, 0, 0, 2, 0, 0, 0, 0], 3, 3, 2, 2), (0, 2))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,92 @@
+"""
+Tests of the control records between the sharded server's acceptor and its
+workers, and of games played on a running sharded server.
+"""
+
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+import unittest
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+
+from Client import GameClient
+from ShardedServer import HANDOFF_SIZE, Shard, send_waiting_ids
+
+HOST = '127.0.0.1'
+
+"""
+Answers one "list" query on the worker's end of a control socket pair.
+"""
+def answer_list(control, game_ids):
+    control.recv(HANDOFF_SIZE)
+    send_waiting_ids(control, game_ids)
+
+@unittest.skipUnless(hasattr(socket, "SOCK_SEQPACKET"), "the sharded server needs SOCK_SEQPACKET")
+class WaitingIdsTest(unittest.TestCase):
+    def list_games(self, game_ids):
+        parent, child = socket.socketpair(socket.AF_UNIX, socket.SOCK_SEQPACKET)
+        with parent, child:
+            worker = threading.Thread(target=answer_list, args=(child, game_ids))
+            worker.start()
+            waiting = Shard(0, None, parent).waiting_ids()
+            worker.join()
+        return waiting
+
+    def test_small_listing(self):
+        self.assertEqual(self.list_games([1, 3, 5]), [1, 3, 5])
+
+    def test_listing_larger_than_a_control_record(self):
+        game_ids = list(range(1, 200001, 4))  # About 290 KiB of JSON
+        self.assertEqual(self.list_games(game_ids), game_ids)
+
+"""
+Plays a game against the server's bot, always taking the first free cell,
+and returns the game_over message.
+"""
+async def play_against_bot(port):
+    client = GameClient(HOST, port)
+    try:
+        await client.create(2, bots=1)
+        async for message in client.events():
+            if client.turn == client.player_id and message["type"] in ("board", "delta"):
+                await client.move(*next((row, col) for row, line in enumerate(client.board)
+                                        for col, symbol in enumerate(line) if symbol == " "))
+        return client.result
+    finally:
+        client.close()
+
+@unittest.skipUnless(hasattr(socket, "send_fds"), "the sharded server needs SCM_RIGHTS")
+class ShardedGameTest(unittest.TestCase):
+    def setUp(self):
+        with socket.socket() as sock:
+            sock.bind((HOST, 0))
+            self.port = sock.getsockname()[1]
+        self.server = subprocess.Popen([sys.executable, os.path.join(ROOT, "Server.py"), "--shards", "2",
+                                        "--port", str(self.port), "--log-level", "ERROR"])
+        deadline = time.monotonic() + 30
+        while True:
+            try:
+                socket.create_connection((HOST, self.port)).close()
+                break
+            except OSError:
+                if time.monotonic() > deadline:
+                    raise
+                time.sleep(0.1)
+
+    def tearDown(self):
+        self.server.terminate()
+        self.server.wait(10)
+
+    def test_bot_game(self):
+        result = asyncio.run(asyncio.wait_for(play_against_bot(self.port), 30))
+        self.assertEqual(result["type"], "game_over")
+        self.assertIn(result["reason"], ("won", "tie"))
+
+if __name__ == "__main__":
+    unittest.main()